@@ -0,0 +1,162 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+import job_store
+import catalog
+from config import episodes_dir, history_dir, playlist_url, max_duration, segment_long_audio, download_retries, \
+    probe_workers, pipeline_concurrency, log_level, log_format, log_datefmt
+
+# 音频获取：多个播放列表条目并发下载（各自重试），ffprobe 在线程池中检测时长，
+# 检测结果按 (文件名, 大小, mtime) 缓存在状态库中，文件在 audio/ 和 history/ 之间移动后也不会重复检测
+# 用法: python acquire.py [index | start-end | url]   或   python acquire.py probe [目录...]
+
+AUDIO_EXTENSIONS = ('.aac', '.m4a', '.wav', '.mp3', '.webm', '.mp4')
+
+_catalog_synced = False
+_catalog_lock = threading.Lock()
+
+
+def parse_items(arg):
+    """与 yt_list_to_srt.sh 相同的参数：空 / index / start-end / url"""
+    if not arg:
+        return ['1']
+    if arg.isdigit():
+        return [arg]
+    range_match = re.match(r'^(\d+)-(\d+)$', arg)
+    if range_match:
+        start, end = int(range_match.group(1)), int(range_match.group(2))
+        if start > end:
+            raise ValueError("输入有误，应为 start-end")
+        return [str(i) for i in range(start, end + 1)]
+    return [arg]
+
+
+def download(item, retries=download_retries):
+    """下载一个播放列表条目或视频地址的音频，失败按指数退避重试，返回音频文件路径列表，失败返回 None"""
+    args = ['--playlist-items', str(item), playlist_url] if str(item).isdigit() else [item]
+    # 如果 -f 249/250/251 下载出错，可以改为 -f wa 让 yt-dlp 自动选择最小体积音频（比较慢）
+    command = ['yt-dlp', *args, '-f', '249/250/251', '-o', os.path.join(episodes_dir, '%(upload_date>%Y-%m-%d)s_%(id)s.%(ext)s'),
+               '--print', 'after_move:filepath']
+    if os.path.exists('yt_cookies.txt'):
+        command += ['--cookies', 'yt_cookies.txt']
+    for attempt in range(retries + 1):
+        logging.info(f"[download] 开始下载 {item}" + (f"（第 {attempt + 1} 次尝试）" if attempt else ""))
+        result = subprocess.run(command, capture_output=True, text=True)
+        paths = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+        if result.returncode == 0 and paths:
+            break
+        logging.warning(f"[download] yt-dlp 下载出错 {item}: {result.stderr.strip()[-500:]}")
+        if attempt < retries:
+            time.sleep(5 * 2 ** attempt)
+    else:
+        logging.error(f"[download] {item} 重试 {retries} 次后仍下载失败")
+        return None
+
+    # 修正文件名中的日期（upload_date 不一定为直播日期）
+    global _catalog_synced
+    with _catalog_lock:
+        if not _catalog_synced:
+            catalog.sync()
+            _catalog_synced = True
+    outputs = []
+    for path in paths:
+        filename = catalog.correct_date(os.path.dirname(path), os.path.basename(path))
+        outputs.append(os.path.join(os.path.dirname(path), filename))
+        logging.info(f"[download] 下载完成 {filename}")
+    return outputs
+
+
+def probe_duration(path):
+    """返回音频时长（秒），优先使用缓存"""
+    stat = os.stat(path)
+    file_name = os.path.basename(path)
+    duration = job_store.get_probe(file_name, stat.st_size, stat.st_mtime_ns)
+    if duration is not None:
+        return duration
+    result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe 出错 {file_name}: {result.stderr.strip()}")
+    duration = float(json.loads(result.stdout)['format']['duration'])
+    job_store.set_probe(file_name, stat.st_size, stat.st_mtime_ns, duration)
+    return duration
+
+
+def probe_durations(paths, workers=probe_workers):
+    """并行检测多个文件的时长，返回 {path: 时长 | None}"""
+    durations = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="probe") as executor:
+        futures = {executor.submit(probe_duration, path): path for path in paths}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="检测音频时长", unit="个"):
+            path = futures[future]
+            try:
+                durations[path] = future.result()
+            except Exception as e:
+                logging.error(f"[probe] {e}")
+                durations[path] = None
+    return durations
+
+
+def check_duration(path, duration=None):
+    """
+    超过 max_duration 的音频按 segment_long_audio 切分为多段（返回路径列表），或截取前 max_duration 秒，
+    原始文件移动到 history_dir，返回要上传的文件路径
+    """
+    if duration is None:
+        duration = probe_duration(path)
+    filename = os.path.basename(path)
+    logging.info(f"[probe] {filename} 时长 {duration:.0f}s")
+    if duration <= max_duration:
+        return path
+    if segment_long_audio:
+        # segment 依赖本模块的 probe_duration，这里延迟导入
+        from segment import split_audio
+        return split_audio(path)
+    name, extension = os.path.splitext(filename)
+    output_path = os.path.join(episodes_dir, f"{name}_6{extension}")
+    logging.info(f"[probe] {filename} 时长超过 {max_duration}s，截取前 {max_duration}s")
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', path, '-t', str(max_duration), '-c', 'copy', output_path], check=True)
+    shutil.move(path, os.path.join(history_dir, filename))
+    return output_path
+
+
+def list_audio(*directories):
+    return sorted(os.path.join(directory, f) for directory in directories if os.path.exists(directory)
+                  for f in os.listdir(directory) if f.lower().endswith(AUDIO_EXTENSIONS))
+
+
+def acquire(items, concurrency):
+    """并发下载并检测时长，返回待上传的音频路径列表"""
+    paths = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="download") as executor:
+        for result in executor.map(download, items):
+            paths.extend(result or [])
+    durations = probe_durations(paths)
+    outputs = []
+    for path, duration in durations.items():
+        if duration is not None:
+            output = check_duration(path, duration)
+            outputs.extend(output if isinstance(output, list) else [output])
+    return outputs
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
+    os.makedirs(episodes_dir, exist_ok=True)
+    os.makedirs(history_dir, exist_ok=True)
+    args = sys.argv[1:]
+    if args and args[0] == 'probe':
+        # 只检测时长（已检测过的文件直接读取缓存）
+        for path, duration in sorted(probe_durations(list_audio(*(args[1:] or [episodes_dir, history_dir]))).items()):
+            print(f"{path}\t{duration}")
+    else:
+        for path in acquire(parse_items(args[0] if args else None), pipeline_concurrency['download']):
+            print(path)
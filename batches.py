@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+from config import batches_dir, episodes_dir, podcast_url
+
+# 按批次发布的 podcast：每次上传把要转写的音频写入 batches_dir/<batch_id>.json 清单，
+# podcast_server.py 在 /podcast/<batch_id>/ 只发布清单中的文件，通义解析时只会看到本批次的音频，
+# 不同的上传（以及 pipeline.py 的每个文件）互不干扰，也不必在整个 episodes_dir 的 feed 中按标题筛选
+# 音频仍存放在 episodes_dir，下载地址仍为 /podcast/music/<文件名>
+
+BATCH_ID_PATTERN = r'^[0-9A-Za-z_-]{1,64}$'
+
+# /podcast/music/、/podcast/transcoded/ 是音频文件的地址，不能用作批次 ID
+RESERVED_IDS = {'music', 'transcoded'}
+
+
+def is_valid_id(batch_id):
+    return re.match(BATCH_ID_PATTERN, batch_id or '') is not None and batch_id not in RESERVED_IDS
+
+
+def manifest_path(batch_id):
+    if not is_valid_id(batch_id):
+        raise ValueError(f"无效的批次 ID: {batch_id}")
+    return os.path.join(batches_dir, f"{batch_id}.json")
+
+
+def feed_url(batch_id, base_url=podcast_url):
+    return f"{base_url.rstrip('/')}/{batch_id}/"
+
+
+def list_batches():
+    if not os.path.exists(batches_dir):
+        return []
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(batches_dir)
+                  if name.endswith('.json') and is_valid_id(os.path.splitext(name)[0]))
+
+
+def load(batch_id):
+    """返回清单 {'id', 'created', 'files': [文件名, ...]}，不存在时返回 None"""
+    try:
+        with open(manifest_path(batch_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def pending_files(directory=episodes_dir):
+    """已在其他批次清单中的文件由那次上传负责，不重复发布"""
+    if not os.path.exists(directory):
+        return []
+    claimed = set()
+    for batch_id in list_batches():
+        manifest = load(batch_id)
+        if manifest:
+            claimed.update(manifest['files'])
+    return sorted(name for name in os.listdir(directory)
+                  if not name.startswith('.') and name not in claimed
+                  and os.path.isfile(os.path.join(directory, name)))
+
+
+def create(files, batch_id=None):
+    """为 episodes_dir 中的文件创建批次清单，返回 batch_id（文件列表为空时返回 None）"""
+    files = [os.path.basename(path) for path in files]
+    if not files:
+        return None
+    if batch_id is None:
+        batch_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    path = manifest_path(batch_id)
+    os.makedirs(batches_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'id': batch_id, 'created': time.time(), 'files': files}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"创建批次 {batch_id}，共 {len(files)} 个文件: {feed_url(batch_id)}")
+    return batch_id
+
+
+def remove(batch_id):
+    """批次提交完成后删除清单，/podcast/<batch_id>/ 随之返回 404"""
+    try:
+        os.remove(manifest_path(batch_id))
+        logging.debug(f"已删除批次 {batch_id}")
+    except FileNotFoundError:
+        pass
+
+
+if __name__ == '__main__':
+    # 用法: python batches.py [list | create [文件 ...] | remove batch_id ...]
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'create':
+        created = create(sys.argv[2:] or pending_files())
+        print(feed_url(created) if created else "没有需要发布的文件")
+    elif command == 'remove':
+        for name in sys.argv[2:]:
+            remove(name)
+    else:
+        for name in list_batches():
+            manifest = load(name) or {'files': []}
+            print(f"{name}\t{len(manifest['files'])} 个文件\t{feed_url(name)}")
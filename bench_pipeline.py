@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import resource
+import subprocess
+import requests
+from bench_podcast_server import wait_port
+
+# 上传、导出流程的离线性能测试：启动 mock_tongyi_server.py，按不同批量运行 process_podcast 和 get_latest_and_export，
+# 输出各阶段用时、接口调用次数、下载文件数和峰值内存，便于对比改动前后的效果
+# 用法: python bench_pipeline.py [批量大小，默认 1,10,50] [接口延迟秒数，默认 0.02] [失败率，默认 0]
+
+BENCH_PORT = 55100
+
+# 轮询间隔按该倍数缩短、限流速率按该倍数放大（mock 的处理时间本身是秒级的）
+TIME_SCALE = 30
+
+# 单个批量的最长运行时间（秒）
+RUN_TIMEOUT = 900
+
+
+def run_child(batch_size):
+    """在子进程中运行一个批量（当前目录为临时目录），最后一行输出 JSON 结果"""
+    import poll_scheduler
+    import rate_limiter
+    import podcast_upload
+    import betch_export
+    from config import export_concurrency, headers
+
+    # mock 不校验 cookie，避免 config 中的占位内容无法编码为请求头
+    headers['cookie'] = 'bench'
+    logging.getLogger().setLevel(logging.WARNING)
+    poll_scheduler.poll_intervals = {kind: (low / TIME_SCALE, high / TIME_SCALE)
+                                     for kind, (low, high) in poll_scheduler.poll_intervals.items()}
+    rate_limiter.rate_limits = {key: (rate * TIME_SCALE, burst * TIME_SCALE)
+                                for key, (rate, burst) in rate_limiter.rate_limits.items()}
+
+    result = {'batch': batch_size, 'ok': True}
+    start = time.monotonic()
+    try:
+        podcast_upload.process_podcast(f"http://bench.local/podcast/?episodes={batch_size}&prefix=b{batch_size}")
+    except SystemExit:
+        result['ok'] = False
+    result['upload'] = time.monotonic() - start
+
+    start = time.monotonic()
+    try:
+        if result['ok']:
+            betch_export.get_latest_and_export(batch_size, concurrency=export_concurrency)
+    except SystemExit:
+        result['ok'] = False
+    result['export'] = time.monotonic() - start
+
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = max_rss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+    print(json.dumps(result))
+
+
+def server_stats(base_url):
+    return requests.get(base_url + 'stats').json()['requests']
+
+
+def bench(batch_size, base_url):
+    before = server_stats(base_url)
+    env = dict(os.environ, TONGYI_EFFICIENCY_HOST=base_url.rstrip('/'), TONGYI_ASSISTANT_HOST=base_url.rstrip('/'))
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_path = os.path.join(work_dir, 'bench.log')
+        with open(log_path, 'w') as log_file:
+            try:
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(batch_size)],
+                                       cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=log_file, text=True,
+                                       timeout=RUN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                print(f"{batch_size:>6}  超过 {RUN_TIMEOUT}s 未完成")
+                return
+        lines = child.stdout.strip().splitlines()
+        if child.returncode != 0 or not lines:
+            with open(log_path) as f:
+                print(f"{batch_size:>6}  运行出错:\n{f.read()[-2000:]}")
+            return
+        result = json.loads(lines[-1])
+
+    after = server_stats(base_url)
+    calls = {path: count - before.get(path, 0) for path, count in after.items() if count > before.get(path, 0)}
+    downloads = sum(count for path, count in calls.items() if path.startswith('/download/'))
+    api_calls = sum(count for path, count in calls.items() if not path.startswith('/download/') and path != '/stats')
+    print(f"{batch_size:>6}  {result['upload']:>8.1f}s {result['export']:>8.1f}s "
+          f"{result['upload'] + result['export']:>8.1f}s {api_calls:>8} {downloads:>8} {result['peak_rss_mb']:>8.1f}MB  "
+          f"{'成功' if result['ok'] else '失败'}")
+    for path, count in sorted(calls.items()):
+        if not path.startswith('/download/') and path != '/stats':
+            print(f"{'':>8}{path:<40}{count:>8}")
+
+
+def main():
+    batch_sizes = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else '1,10,50').split(',')]
+    latency = sys.argv[2] if len(sys.argv) > 2 else '0.02'
+    failure_rate = sys.argv[3] if len(sys.argv) > 3 else '0'
+    base_url = f"http://127.0.0.1:{BENCH_PORT}/"
+    server = subprocess.Popen([sys.executable, 'mock_tongyi_server.py', '--port', str(BENCH_PORT),
+                               '--latency', latency, '--failure-rate', failure_rate],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_port(BENCH_PORT):
+            print("mock 服务启动失败")
+            return
+        print(f"接口延迟 {latency}s，失败率 {failure_rate}，轮询间隔缩短 {TIME_SCALE} 倍")
+        print(f"{'批量':>6}  {'上传转写':>8}  {'导出':>8}  {'合计':>8}  {'接口调用':>6} {'下载文件':>6} {'峰值内存':>8}")
+        for batch_size in batch_sizes:
+            bench(batch_size, base_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        run_child(int(sys.argv[2]))
+    else:
+        main()
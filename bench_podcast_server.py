@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# podcast_server 并发下载吞吐量对比：Flask 自带服务 vs gunicorn 多进程（sendfile）
+# 用法: python bench_podcast_server.py [文件大小MB，默认 200] [并发数，默认 4]
+
+BENCH_PORT = 55099
+
+SERVER_BOOTSTRAP = """
+import sys
+import podcast_server
+podcast_server.episodes_dir = sys.argv[1]
+podcast_server.episode_index = podcast_server.EpisodeIndex(sys.argv[1])
+podcast_server.port = int(sys.argv[2])
+podcast_server.run_server(workers=int(sys.argv[3]))
+"""
+
+
+def wait_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def fetch(url, headers=None):
+    received = 0
+    with requests.get(url, stream=True, headers=headers) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            received += len(chunk)
+    return received, response.status_code
+
+
+def bench(name, workers, audio_dir, filename, clients):
+    server = subprocess.Popen([sys.executable, '-c', SERVER_BOOTSTRAP, audio_dir, str(BENCH_PORT), str(workers)],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_port(BENCH_PORT):
+            print(f"{name}: 服务启动失败")
+            return
+        url = f"http://127.0.0.1:{BENCH_PORT}/podcast/music/{filename}"
+        _, range_status = fetch(url, headers={'Range': 'bytes=0-1023'})
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(lambda _: fetch(url), range(clients)))
+        elapsed = time.monotonic() - start
+        total = sum(received for received, _ in results)
+        print(f"{name:<10} workers={workers:<2} clients={clients:<3} 总计 {total / 1024 / 1024:.0f} MB "
+              f"用时 {elapsed:.2f}s 吞吐 {total / 1024 / 1024 / elapsed:.1f} MB/s  Range 请求状态: {range_status}")
+    finally:
+        server.terminate()
+        server.wait()
+        time.sleep(0.5)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as audio_dir:
+        filename = '2000-01-01_benchmark00.webm'
+        with open(os.path.join(audio_dir, filename), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        print(f"测试文件 {size_mb} MB，并发 {clients}")
+        bench('flask', 1, audio_dir, filename, clients)
+        if importlib.util.find_spec('gunicorn') is not None:
+            bench('gunicorn', max(2, os.cpu_count() or 2), audio_dir, filename, clients)
+        else:
+            print("未安装 gunicorn，跳过多进程服务测试")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,23 @@
 import os
 import sys
+import atexit
 import time
 import logging
-import requests
-import urllib.parse
+import threading
+import http_client
+import job_store
+import metrics
+import segment
 import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+import downloader
+from downloader import download_all, file_name_from_url
+from poll_scheduler import PollScheduler, PollError, PENDING, DONE, FAILED, transcription_eta, transcription_timeout, \
+    sweep_records
 from config import headers, exportDetails, wait_mind_map_summary, wait_mind_map_summary_minutes, log_level, log_format, \
-    log_datefmt, result_dir
+    log_datefmt, result_dir, export_concurrency, export_batch_size, split_export, download_concurrency, \
+    record_list_page_size, record_list_prefetch, tongyi_efficiency_host, tongyi_assistant_host
 
 
 # 设置兼容 tqdm 的 logging
@@ -20,8 +30,9 @@ class TqdmLoggingHandler(logging.Handler):
 logging.basicConfig(level=log_level, handlers=[TqdmLoggingHandler()], format=log_format, datefmt=log_datefmt)
 
 
+@metrics.track_api
 def request_0(record_id):
-    url = "https://tw-efficiency.biz.aliyun.com/api/lab/getAllLabInfo?c=tongyi-web"
+    url = f"{tongyi_efficiency_host}/api/lab/getAllLabInfo?c=tongyi-web"
     payload = {
         "action": "getAllLabInfo",
         "transId": record_id,
@@ -31,7 +42,7 @@ def request_0(record_id):
         ]
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload, idempotent=True)
 
     if response.status_code == 200:
         response_json_0 = response.json()
@@ -46,15 +57,16 @@ def request_0(record_id):
         return None
 
 
-def request_1(record_id):
-    url = "https://tw-efficiency.biz.aliyun.com/api/export/request?c=tongyi-web"
+@metrics.track_api
+def request_1(record_ids, details=exportDetails):
+    url = f"{tongyi_efficiency_host}/api/export/request?c=tongyi-web"
     payload = {
         "action": "exportTrans",
-        "transIds": [record_id],
-        "exportDetails": exportDetails
+        "transIds": record_ids,
+        "exportDetails": details
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload)
 
     if response.status_code == 200:
         response_json_1 = response.json()
@@ -69,14 +81,15 @@ def request_1(record_id):
         return None
 
 
+@metrics.track_api
 def request_2(exportTaskId):
-    url = "https://tw-efficiency.biz.aliyun.com/api/export/request?c=tongyi-web"
+    url = f"{tongyi_efficiency_host}/api/export/request?c=tongyi-web"
     payload = {
         "action": "getExportStatus",
         "exportTaskId": exportTaskId
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload, idempotent=True)
     if response.status_code == 200:
         response_json_2 = response.json()
         logging.debug(f"received response_json_2: {response_json_2}")
@@ -86,8 +99,9 @@ def request_2(exportTaskId):
         return None
 
 
+@metrics.track_api
 def get_record_list(page_no=1, page_size=1, show_name=None):
-    url = "https://qianwen.biz.aliyun.com/assistant/api/record/list?c=tongyi-web"
+    url = f"{tongyi_assistant_host}/assistant/api/record/list?c=tongyi-web"
     payload = {
         "status": [10, 20, 30, 33, 40, 41, 43],
         "beginTime": "",
@@ -101,7 +115,7 @@ def get_record_list(page_no=1, page_size=1, show_name=None):
         "pageSize": page_size,
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload, idempotent=True)
 
     if response.status_code == 200:
         response_get_list = response.json()
@@ -131,298 +145,546 @@ def get_record_list(page_no=1, page_size=1, show_name=None):
         return None
 
 
-def clean_srt_files(root_path="."):
-    to_replace_1 = '\u200b'
-    to_replace_2 = '\u200c'
+def sweep_transcription(record_ids):
+    return {record_id: transcription_state(record_info)
+            for record_id, record_info in sweep_records(get_record_list, record_ids)}
+
+
+def transcription_state(record_info):
+    record_status = record_info['recordStatus']
+    job_store.advance_record(record_info['genRecordId'], 'transcribed' if record_status == 30 else None,
+                             title=record_info['recordTitle'], status=record_status)
+    if record_status == 30:
+        return DONE, record_info
+    elif record_status == 40:
+        return FAILED, record_info
+    return PENDING, record_status
+
+
+def sweep_mind_map(record_ids):
+    # getAllLabInfo 只能按单条记录查询
+    results = {}
+    for record_id in record_ids:
+        response0 = request_0(record_id)
+        if response0 is None or response0.get('labCardsMap') is None or response0['labCardsMap'].get('labInfo') is None:
+            logging.error(f"step 0: 未找到功能列表，稍后重试 record_id: {record_id}")
+            continue
+        for lab_item in response0['labCardsMap']['labInfo']:
+            if lab_item.get('key') == 'mindMapSummary' and lab_item.get('contents') is not None:
+                results[record_id] = (DONE, lab_item)
+                break
+    return results
 
-    for dirpath, _, filenames in os.walk(root_path):
-        for filename in filenames:
-            if filename.endswith("_原文.srt"):
-                file_path = os.path.join(dirpath, filename)
-                logging.info(f"处理文件: {file_path}")
 
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+def sweep_export(export_task_ids):
+    results = {}
+    for export_task_id in export_task_ids:
+        response2 = request_2(export_task_id)
+        if response2 is not None and response2.get('exportStatus') == 1:
+            results[export_task_id] = (DONE, response2)
+    return results
 
-                count_1 = content.count(to_replace_1)
-                count_2 = content.count(to_replace_2)
-                count = count_1 + count_2
-                if count > 0:
-                    new_content = content.replace(to_replace_1, "")
-                    new_content = new_content.replace(to_replace_2, "")
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(new_content)
-                    logging.info(f"已替换 {count} 个目标字符。")
-                else:
-                    logging.info("未发现目标字符，无需替换。")
 
+scheduler = PollScheduler()
+scheduler.register('transcription', sweep_transcription)
+scheduler.register('mind_map', sweep_mind_map)
+scheduler.register('export', sweep_export)
 
-def export_from_record_id(record_title, record_id):
-    try:
-        logging.info(f"开始导出 {record_title} record_id: {record_id}")
-        time.sleep(2)
 
-        # 检测是否有思维导图
-        if wait_mind_map_summary:
-            mind_map_summary_done = False
-            logging.info("step 0: 不跳过思维导图，检测是否有思维导图")
-            time.sleep(2)
-            # 使用tqdm包装等待循环
-            with tqdm(range(wait_mind_map_summary_minutes), desc="检测思维导图生成状态") as progress:
-                for _ in progress:
-                    response0 = request_0(record_id)
-                    if response0 is not None and response0.get('labCardsMap') is not None and response0['labCardsMap'].get('labInfo') is not None:
-                        lab_info = response0['labCardsMap']['labInfo']
-                        for lab_item in lab_info:
-                            if lab_item.get('key') == 'mindMapSummary' and lab_item.get('contents') is not None:
-                                mind_map_summary_done = True
-                                break
-                    else:
-                        logging.error("step 0: 未找到功能列表，稍后重试")
-                    if mind_map_summary_done:
-                        progress.n = progress.total
-                        progress.set_description(f"思维导图已生成")
-                        progress.close()
-                        break
-                    time.sleep(60)
-
-            if mind_map_summary_done:
-                logging.info("step 0 success: 思维导图已生成")
-            else:
-                logging.error("step 0 error: 思维导图仍未生成，跳过导出")
-
-        # 第一步请求
-        logging.info("step 1: 查询 Task ID")
-        time.sleep(2)
-        response1 = None
-        # 使用tqdm包装重试循环
-        with tqdm(range(30), desc="查询 Task ID") as progress:
-            for i in progress:
-                response1 = request_1(record_id)
-                if response1 is not None and response1.get('exportTaskId') is not None:
-                    progress.n = progress.total
-                    progress.set_description(f"查询 Task ID 已就绪")
-                    progress.close()
-                    break
-                time.sleep(2)
+def describe(records):
+    return records[0][0] if len(records) == 1 else f"{records[0][0]} 等 {len(records)} 条"
 
-        if response1 is None or response1.get('exportTaskId') is None:
-            logging.error("step 1 error: 查询 Task ID 失败")
-            sys.exit(1)
-        logging.info("step 1 success: 查询 Task ID 已就绪: " + response1['exportTaskId'])
-
-        export_task_id = response1['exportTaskId']
-
-        # 第二步请求
-        logging.info("step 2: 查询任务状态")
-        time.sleep(2)
-        response2 = None
-        # 使用tqdm包装重试循环
-        progress = tqdm(range(30), desc="查询任务状态是否已就绪")
-        for _ in progress:
-            response2 = request_2(export_task_id)
-            if response2 is not None and response2.get('exportStatus') == 1:
+
+def route_export_url(url_data, titles):
+    """按 transId 确定导出文件属于哪条记录；没有 transId 时按文件名开头的标题匹配（取最长的标题）"""
+    if url_data.get('transId') in titles:
+        return url_data['transId']
+    file_name = file_name_from_url(url_data['url'])
+    matches = [record_id for record_id, title in titles.items() if file_name.startswith(title)]
+    return max(matches, key=lambda record_id: len(titles[record_id])) if matches else None
+
+
+def download_record(record_title, record_id, url_list, desc):
+    """下载一条记录的导出文件到 result/<标题>/，返回文件路径列表，失败返回 None"""
+    if not url_list:
+        logging.error("导出失败，record_id: " + record_id)
+        return None
+    # 同一条记录的所有文件并行下载
+    results = download_all([url_data['url'] for url_data in url_list], result_dir + record_title,
+                           desc=f"导出文件 {desc}")
+    for url_data in url_list:
+        if not isinstance(results.get(url_data['url']), Exception):
+            logging.info(f"step 3 success: 导出成功 doc_type: {url_data['docType']} {desc}")
+    if any(isinstance(result, Exception) for result in results.values()):
+        logging.error(f"step 3 error: {desc} 部分文件下载失败，重新导出时将断点续传")
+        return None
+
+    # srt 中的零宽字符已在下载时过滤
+    for path in results.values():
+        job_store.add_artifact(record_id, path)
+    return list(results.values())
+
+
+def export_batch(records, details, desc):
+    """
+    step 1 - 3：一个 exportTrans 请求导出多条记录（records 为 [(标题, record_id), ...]），只轮询一个 exportTaskId，
+    导出文件按 transId 分别下载到各自的 result/<标题>/，返回 {record_id: 文件路径列表 | None}
+    """
+    titles = {record_id: record_title for record_title, record_id in records}
+    results = {record_id: None for record_id in titles}
+
+    # 第一步请求
+    logging.info(f"step 1: 查询 Task ID {desc}")
+    response1 = None
+    # 使用tqdm包装重试循环
+    with tqdm(range(30), desc=f"查询 Task ID {desc}") as progress:
+        for i in progress:
+            response1 = request_1(list(titles), details)
+            if response1 is not None and response1.get('exportTaskId') is not None:
                 progress.n = progress.total
-                progress.set_description(f"任务状态已就绪")
+                progress.set_description(f"查询 Task ID 已就绪 {desc}")
                 progress.close()
                 break
             time.sleep(2)
 
-        if response2 is None or response2.get('exportStatus') == 0:
-            logging.error("step 2 error: 任务状态未就绪")
-            sys.exit(1)
-        logging.info("step 2 success: 任务状态已就绪")
-
-        export_urls = response2['exportUrls']
-        # 第三步请求
-        logging.info("step 3: 准备导出")
-        if export_urls is not None and len(export_urls) > 0:
-            # 使用tqdm包装下载文件的循环
-            for url_data in tqdm(export_urls, desc=f"导出文件 {record_title}", unit="个"):
-                time.sleep(1)
-                logging.debug(f"Export url_data: {url_data}")
-                doc_type = str(url_data['docType'])
-                if url_data['success']:
-                    download_file(url_data['url'], result_dir + record_title)
-                    logging.info(f"step 3 success: 导出成功 doc_type: {doc_type}")
-                else:
-                    logging.error(f"step 3 error: 导出失败 record_id: {record_id} doc_type: {doc_type}")
-
-            logging.info(f"step 3 success: {record_title} 导出完成")
-            logging.info(f"step 4 : 清理 srt 文件中的多余字符 {record_title}")
-            clean_srt_files(result_dir + record_title)
-        else:
-            logging.error("导出失败，record_id: " + record_id)
+    if response1 is None or response1.get('exportTaskId') is None:
+        logging.error(f"step 1 error: 查询 Task ID 失败 {desc}")
+        return results
+    logging.info(f"step 1 success: 查询 Task ID 已就绪: {response1['exportTaskId']} {desc}")
 
-    except Exception as e:
-        logging.error(f"导出失败: {e} record_id: {record_id}")
+    export_task_id = response1['exportTaskId']
+    for record_id in titles:
+        job_store.advance_record(record_id, 'export_requested', export_task_id=export_task_id)
+
+    # 第二步请求：记录越多，导出任务准备的时间越长
+    logging.info(f"step 2: 查询任务状态 {desc}")
+    try:
+        response2 = scheduler.wait('export', export_task_id, timeout=60 + 5 * (len(titles) - 1),
+                                   desc=f"查询任务状态是否已就绪 {desc}", done_desc=f"任务状态已就绪 {desc}")
+    except TimeoutError:
+        logging.error(f"step 2 error: 任务状态未就绪 {desc}")
+        return results
+    logging.info(f"step 2 success: 任务状态已就绪 {desc}")
+
+    export_urls = response2['exportUrls']
+    # 第三步请求
+    logging.info(f"step 3: 准备导出 {desc}")
+    if export_urls is None or len(export_urls) == 0:
+        logging.error(f"导出失败，record_id: {', '.join(titles)}")
+        return results
+    routed = {record_id: [] for record_id in titles}
+    for url_data in export_urls:
+        logging.debug(f"Export url_data: {url_data}")
+        record_id = route_export_url(url_data, titles)
+        if record_id is None:
+            logging.error(f"step 3 error: 无法确定导出文件所属的记录 {file_name_from_url(url_data['url'])}")
+        elif not url_data['success']:
+            logging.error(f"step 3 error: 导出失败 record_id: {record_id} doc_type: {url_data['docType']}")
+        else:
+            routed[record_id].append(url_data)
+    with ThreadPoolExecutor(max_workers=max(1, min(len(titles), download_concurrency)),
+                            thread_name_prefix="export-download") as executor:
+        futures = {executor.submit(download_record, titles[record_id], record_id, url_list,
+                                   titles[record_id] if len(titles) > 1 else desc): record_id
+                   for record_id, url_list in routed.items()}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def split_details(details=exportDetails):
+    """分为 (原文、字幕, 导读、脑图)：前者转写完成即可导出，后者需要等思维导图生成"""
+    return [d for d in details if d['docType'] == 1], [d for d in details if d['docType'] != 1]
+
+
+def wait_mind_maps(records):
+    """step 0：等待各记录的思维导图生成（由轮询调度器同时检测），超时仍继续导出"""
+    futures = {}
+    for record_title, record_id in records:
+        if job_store.reached(job_store.get_record(record_id), 'mind_map_ready'):
+            logging.info(f"step 0: 思维导图此前已生成，跳过检测 {record_title}")
+            continue
+        logging.info(f"step 0: 不跳过思维导图，检测是否有思维导图 {record_title}")
+        futures[scheduler.submit('mind_map', record_id, timeout=wait_mind_map_summary_minutes * 60,
+                                 desc=f"检测思维导图生成状态 {record_title}",
+                                 done_desc=f"思维导图已生成 {record_title}")] = (record_title, record_id)
+    for future in as_completed(futures):
+        record_title, record_id = futures[future]
+        try:
+            future.result()
+        except TimeoutError:
+            logging.error(f"step 0 error: 思维导图仍未生成，跳过导出 {record_title}")
+            continue
+        job_store.advance_record(record_id, 'mind_map_ready')
+        logging.info(f"step 0 success: 思维导图已生成 {record_title}")
+
+
+def export_chunk(records, split=split_export):
+    """
+    用一个导出任务导出一批记录，返回失败的条数；
+    split 时先导出原文和字幕，导读、脑图放入延后队列（见 defer_summary），由 wait_deferred 等待完成
+    """
+    try:
+        transcript_details, summary_details = split_details()
+        split = split and wait_mind_map_summary and transcript_details and summary_details
+        pending = []
+        deferred = []
+        for record_title, record_id in records:
+            record = job_store.get_record(record_id)
+            if job_store.reached(record, 'exported') and job_store.artifacts_intact(record_id):
+                logging.info(f"{record_title} 已导出过且文件完整，跳过 record_id: {record_id}")
+                continue
+            job_store.advance_record(record_id, 'transcribed', title=record_title)
+            if split and job_store.reached(record, 'transcript_exported') and job_store.artifacts_intact(record_id):
+                logging.info(f"{record_title} 原文和字幕已导出过，只导出导读、脑图")
+                deferred.append((record_title, record_id))
+                continue
+            logging.info(f"开始导出 {record_title} record_id: {record_id}")
+            pending.append((record_title, record_id))
 
+        failed_count = 0
+        if split:
+            results = export_batch(pending, transcript_details, f"{describe(pending)} 原文") if pending else {}
+        else:
+            if wait_mind_map_summary:
+                wait_mind_maps(pending)
+            results = export_batch(pending, exportDetails, describe(pending)) if pending else {}
+        for record_title, record_id in pending:
+            if results.get(record_id) is None:
+                failed_count += 1
+                continue
+            if split:
+                logging.info(f"step 3 success: {record_title} 原文和字幕导出完成，导读、脑图在思维导图生成后导出")
+                job_store.advance_record(record_id, 'transcript_exported')
+                deferred.append((record_title, record_id))
+            else:
+                logging.info(f"step 3 success: {record_title} 导出完成")
+                job_store.advance_record(record_id, 'exported')
+            # 长音频的分段全部导出后合并字幕
+            segment.merge_if_complete(record_title)
+        for record_title, record_id in deferred:
+            defer_summary(record_title, record_id)
+        return failed_count
 
-def download_file(url, file_path):
-    if not os.path.exists(file_path):
-        os.makedirs(file_path)  # 创建文件夹
-    # 使用 `requests` 库下载文件
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    file_name = url.split("UTF-8%27%27")[-1]
-    file_name = urllib.parse.unquote(file_name)
-    file_name = urllib.parse.unquote(file_name)
-    # 直接将文件内容写入磁盘，使用 URL 中的文件名
-    with open(f'{file_path}/{file_name}', "wb") as f:
-        for chunk in response.iter_content(chunk_size=1024):
-            f.write(chunk)
+    except Exception as e:
+        logging.error(f"导出失败: {e} record_id: {', '.join(record_id for _, record_id in records)}")
+        return len(records)
+
+
+def export_from_record_id(record_title, record_id, split=split_export):
+    """导出单条转写记录，成功返回 True，失败返回 False"""
+    return export_chunk([(record_title, record_id)], split) == 0
+
+
+# 延后导出的导读、脑图：思维导图由轮询调度器在后台检测（sweep_mind_map），
+# 生成后放入 _ready，在 _deferred_executor 中把此时已就绪的记录合并为一个导出任务
+_deferred = {}  # record_id -> Future（结果为是否导出成功）
+_ready = []  # [(标题, record_id, Future)]
+_deferred_lock = threading.Lock()
+_deferred_executor = ThreadPoolExecutor(max_workers=max(1, export_concurrency), thread_name_prefix="deferred")
+
+
+def defer_summary(record_title, record_id):
+    """登记延后导出，返回 Future；同一条记录只登记一次"""
+    with _deferred_lock:
+        result = _deferred.get(record_id)
+        if result is not None:
+            return result
+        result = Future()
+        _deferred[record_id] = result
+    logging.info(f"step 0: {record_title} 导读、脑图加入延后队列，等待思维导图生成")
+    wait = scheduler.submit('mind_map', record_id, timeout=wait_mind_map_summary_minutes * 60)
+    wait.add_done_callback(lambda future: _mind_map_done(record_title, record_id, future, result))
+    return result
+
+
+def _mind_map_done(record_title, record_id, wait, result):
+    # 回调在调度线程中执行，只负责转交，导出在 _deferred_executor 中进行
+    if wait.exception() is not None:
+        logging.error(f"step 0 error: 思维导图仍未生成，跳过导出导读、脑图 {record_title}")
+        result.set_result(False)
+        return
+    logging.info(f"step 0 success: 思维导图已生成 {record_title}")
+    with _deferred_lock:
+        _ready.append((record_title, record_id, result))
+    _deferred_executor.submit(_export_ready)
 
 
-def export_from_text():
+def _export_ready():
+    with _deferred_lock:
+        ready = _ready[:max(1, export_batch_size)]
+        del _ready[:len(ready)]
+    if not ready:
+        return
+    records = [(record_title, record_id) for record_title, record_id, _ in ready]
+    try:
+        results = export_batch(records, split_details()[1], f"{describe(records)} 导读、脑图")
+    except Exception as e:
+        logging.error(f"导出导读、脑图失败: {e}")
+        results = {}
+    for record_title, record_id, result in ready:
+        ok = results.get(record_id) is not None
+        if ok:
+            job_store.advance_record(record_id, 'exported')
+            logging.info(f"step 3 success: {record_title} 导读、脑图导出完成")
+            # 分段的直播流：各段的导读、脑图此时才导出，重新合并一次
+            try:
+                segment.merge_if_complete(record_title)
+            except OSError as e:
+                logging.error(f"[segment] 合并 {record_title} 失败: {e}")
+        result.set_result(ok)
+
+
+def wait_deferred():
+    """等待延后队列中的导出全部完成，返回失败的条数"""
+    with _deferred_lock:
+        futures = list(_deferred.values())
+    if not futures:
+        return 0
+    failed_count = 0
+    for future in tqdm(as_completed(futures), total=len(futures), desc="等待思维导图并导出导读、脑图", unit="个"):
+        if not future.result():
+            failed_count += 1
+    if failed_count > 0:
+        logging.error(f"导读、脑图导出完成，其中 {failed_count} / {len(futures)} 条失败")
+    return failed_count
+
+
+def export_records(record_list, concurrency=export_concurrency, batch_size=export_batch_size):
+    """
+    并发导出多条转写记录，record_list 为 [(record_title, record_id), ...]
+    每 batch_size 条记录合并为一个导出任务，同时最多有 concurrency 个导出任务，返回导出失败的条数
+    """
+    record_count = len(record_list)
+    if record_count == 0:
+        return 0
+    batch_size = max(1, batch_size)
+    chunks = [record_list[i:i + batch_size] for i in range(0, record_count, batch_size)]
+    if len(chunks) == 1:
+        failed_count = export_chunk(chunks[0])
+    else:
+        concurrency = max(1, min(concurrency, len(chunks)))
+        logging.info(f"准备导出 {record_count} 条转写任务，分为 {len(chunks)} 个导出任务，并发数: {concurrency}")
+        failed_count = 0
+        done_count = 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="export") as executor:
+            futures = {executor.submit(export_chunk, chunk): chunk for chunk in chunks}
+            with tqdm(total=record_count, desc="导出转写任务", unit="个") as progress:
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    done_count += len(chunk)
+                    failed_count += future.result()
+                    progress.update(len(chunk))
+                    progress.set_description(f"导出转写任务 {done_count} / {record_count}")
+    if failed_count > 0:
+        logging.error(f"导出完成，其中 {failed_count} / {record_count} 条导出失败")
+    return failed_count
+
+
+def export_from_text(concurrency=export_concurrency):
+    record_list = []
     try:
-        with open('record_info.txt', 'r', encoding='utf8') as f_count:
-            lines_to_process = [line for line in f_count if line.strip() and not line.startswith("#") and "\t" in line]
-        total_lines = len(lines_to_process)
+        with open(RECORD_INFO_FILE, 'r', encoding='utf8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "\t" not in line:
+                    continue
+                split_parts = line.split("\t")
+                if len(split_parts) < 2:
+                    logging.warning(f"跳过格式不正确的行: {line}")
+                    continue
+                record_list.append((split_parts[1], split_parts[0]))
     except FileNotFoundError:
         logging.error("record_info.txt 未找到！")
         return
 
-    if total_lines == 0:
+    if len(record_list) == 0:
         logging.warning("record_info.txt中没有有效记录可供导出。")
         return
 
-    with open('record_info.txt', 'r', encoding='utf8') as f:
-        for line in tqdm(f, total=total_lines, desc="从record_info.txt导出", unit="条"):
-            line = line.strip()
-            if not line or line.startswith("#") or "\t" not in line:
-                continue
-            split_parts = line.split("\t")
-            if len(split_parts) < 2:
-                logging.warning(f"跳过格式不正确的行: {line}")
-                continue
-            record_id = split_parts[0]
-            file_path_title = split_parts[1]
+    logging.info(f"从record_info.txt导出 {len(record_list)} 条记录")
+    if export_records(record_list, concurrency) + wait_deferred() > 0:
+        sys.exit(1)
 
-            export_from_record_id(file_path_title, record_id)
-            time.sleep(2)  # 保持原有的延时
 
+RECORD_INFO_FILE = 'record_info.txt'
+RECORD_INFO_HEADER = '#record_id\t标题\t关键字\t内容摘要\n'
 
-def get_list_to_file():
-    page_no = 1
-    page_size = 30
 
-    # 初始获取，确定是否需要写入文件头
-    logging.info(f"获取任务列表，页码: {page_no}, 每页大小: {page_size}")
-    record_list = get_record_list(page_no, page_size)
-    if not record_list:  # 检查列表是否为空或者None
-        logging.error("获取任务列表为空，请检查cookie等信息或网络。")
-        return
+def format_record_line(record_info):
+    tags = ','.join(record_info.get('recordTags') or [])
+    return f"{record_info['genRecordId']}\t{record_info['recordTitle']}\t{tags}\t{record_info.get('recordContent') or ''}\n"
 
-    with open('record_info.txt', 'w', encoding='utf8') as f:
-        f.write('#record_id\t标题\t关键字\t内容摘要\n')
 
-    # 使用一个不确定总数的tqdm进度条来显示处理的页数
-    with tqdm(desc="获取任务列表并写入记录", unit="页") as pbar_pages:
-        while record_list:  # 只要record_list不为空就继续
+def load_record_lines(path=RECORD_INFO_FILE):
+    """读取已保存的记录，返回 {record_id: 行}（保持文件中的顺序）"""
+    lines = {}
+    try:
+        with open(path, 'r', encoding='utf8') as f:
+            for line in f:
+                if line.startswith('#') or '\t' not in line:
+                    continue
+                lines[line.split('\t', 1)[0]] = line if line.endswith('\n') else line + '\n'
+    except FileNotFoundError:
+        pass
+    return lines
+
+
+def fetch_record_pages(page_size, prefetch, should_stop):
+    """按页顺序返回 (页码, 记录列表)，同时预取后续 prefetch 页；遇到空页或 should_stop(记录列表) 为真时停止"""
+    with ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix="record-list") as executor:
+        futures = {page_no: executor.submit(get_record_list, page_no, page_size) for page_no in range(1, prefetch + 1)}
+        page_no = 1
+        try:
+            while True:
+                record_list = futures.pop(page_no).result()
+                if not record_list:
+                    break
+                yield page_no, record_list
+                if should_stop(record_list):
+                    break
+                futures[page_no + prefetch] = executor.submit(get_record_list, page_no + prefetch, page_size)
+                page_no += 1
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+
+def get_list_to_file(full=False, page_size=record_list_page_size, prefetch=record_list_prefetch):
+    """
+    同步转写列表到 record_info.txt。默认增量同步：列表按时间倒序，
+    到达已保存的最新记录后，遇到没有新增或变化的一页即停止，之前的记录保持不变；full 为 True 时获取全部页
+    """
+    known = load_record_lines()
+    newest_known = next(iter(known), None)
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+    fetched = {}
+
+    def should_stop(record_list):
+        if full or newest_known is None:
+            return False
+        # 已到达保存过的最新记录，且本页没有新增或变化的记录
+        return newest_known in fetched and all(fetched[record_info['genRecordId']] == known.get(record_info['genRecordId'])
+                                               for record_info in record_list)
+
+    logging.info(f"{'全量' if full or newest_known is None else '增量'}获取任务列表，每页 {page_size} 条，预取 {prefetch} 页")
+    with tqdm(desc="获取任务列表", unit="页") as pbar_pages:
+        for page_no, record_list in fetch_record_pages(page_size, prefetch, should_stop):
+            for record_info in record_list:
+                line = format_record_line(record_info)
+                old_line = known.get(record_info['genRecordId'])
+                counts['new' if old_line is None else 'unchanged' if old_line == line else 'changed'] += 1
+                fetched[record_info['genRecordId']] = line
+            pbar_pages.update(1)
             pbar_pages.set_postfix_str(f"当前页: {page_no}, 获取到: {len(record_list)}条")
-            logging.info(f"获得{len(record_list)}条数据，准备写入文件 (来自页码 {page_no})")
-            with open('record_info.txt', 'a', encoding='utf8') as f:
-                # 为当前页的记录写入添加一个内部进度条
-                for record_info in tqdm(record_list, desc=f"写入第{page_no}页记录", unit="条"):
-                    f.write(f"{record_info['genRecordId']}\t{record_info['recordTitle']}\t")
-                    if record_info.get('recordTags'):  # 检查是否存在
-                        f.write(','.join(record_info['recordTags']))
-                    f.write(f"\t{record_info.get('recordContent', '')}\n")  # 确保内容存在
-
-            time.sleep(1.5)
-            page_no += 1
-            pbar_pages.update(1)  # 更新页数进度条
-            logging.info(f"准备获取下一页: {page_no}")
-            record_list = get_record_list(page_no, page_size)
-            if record_list is None:
-                logging.info(f"获取第 {page_no} 页记录为空，停止获取。")
-                break
 
-    logging.info("get_list_to_file 完成")
+    if not fetched:
+        logging.error("获取任务列表为空，请检查cookie等信息或网络。")
+        return
+
+    # 新获取的记录在前，增量模式下保留未获取到的旧记录；一次写入临时文件后替换
+    lines = list(fetched.values())
+    if not full:
+        lines += [line for record_id, line in known.items() if record_id not in fetched]
+    tmp_path = RECORD_INFO_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8', buffering=1024 * 1024) as f:
+        f.write(RECORD_INFO_HEADER)
+        f.writelines(lines)
+    os.replace(tmp_path, RECORD_INFO_FILE)
+
+    logging.info(f"get_list_to_file 完成: 共 {len(lines)} 条，新增 {counts['new']}，变化 {counts['changed']}，"
+                 f"未变化 {counts['unchanged']}" + ("" if full else f"，未重新获取 {len(lines) - len(fetched)}"))
 
 
 # 从转写列表获取最新一条并导出
-def get_latest_and_export(page_size=1, show_name=None):
+def get_latest_and_export(page_size=1, show_name=None, concurrency=export_concurrency):
     page_no = 1
-    all_task_done = False
-    record_list = []
     logging.info(f"检测转写任务状态状态")
-    progress = tqdm(range(30), desc="检测转写任务状态")
-    for _ in progress:  # 最多重试30次，30分钟
-        record_list = get_record_list(page_no, page_size, show_name)
-        if len(record_list) == 0:
-            logging.error(f"未获取到任务列表，请确认 cookies{'' if show_name is None else ' / 关键字'} 是否有效")
-            progress.set_description(f"查询转写任务状态失败")
-            progress.close()
-            sys.exit(1)
-        all_count = len(record_list)
-        done_count = 0
-        for record_info in record_list:
-            record_title = record_info['recordTitle']
-            record_status = record_info['recordStatus']
-            record_id = record_info['genRecordId']
-            if record_status == 40:
-                logging.error(f"{record_id} 转写失败，请到网页查看详情。{record_title} 状态: {record_status}")
-                progress.set_description(f"转写失败")
-                progress.close()
-                sys.exit(1)
-            elif record_status == 30:
-                done_count += 1
-            else:
-                logging.debug(f"{record_id} 转写暂未完成 {record_title} 状态: {record_status}")
-        progress.set_description(f"检测转写任务状态 {done_count + 1} / {all_count}")
-        if done_count == all_count:
-            all_task_done = True
-            progress.n = progress.total
-            progress.set_description(f"转写任务已完成")
-            progress.close()
-            break
-        time.sleep(60)
-
-    if not all_task_done:
-        logging.error(f"转写任务超时未完成，请到网页查看详情")
+    record_list = get_record_list(page_no, page_size, show_name)
+    if not record_list:
+        logging.error(f"未获取到任务列表，请确认 cookies{'' if show_name is None else ' / 关键字'} 是否有效")
         sys.exit(1)
-    logging.info(f"已转写完成，准备导出")
-    time.sleep(2)
-    record_count = len(record_list)
-    if record_count == 1:
-        record_info = record_list[0]
+    all_count = len(record_list)
+    pending = {}
+    for record_info in record_list:
         record_title = record_info['recordTitle']
+        record_status = record_info['recordStatus']
         record_id = record_info['genRecordId']
-        export_from_record_id(record_title, record_id)
-    else:
-        progress = tqdm(record_list, desc="导出转写任务", unit="个")
-        done_count = 0
-        for record_info in progress:
-            record_title = record_info['recordTitle']
-            record_id = record_info['genRecordId']
-            export_from_record_id(record_title, record_id)
+        if record_status == 40:
+            logging.error(f"{record_id} 转写失败，请到网页查看详情。{record_title} 状态: {record_status}")
+            sys.exit(1)
+        elif record_status != 30:
+            logging.debug(f"{record_id} 转写暂未完成 {record_title} 状态: {record_status}")
+            # 至少等待 30 分钟，长音频按时长延长
+            pending[scheduler.submit('transcription', record_id, timeout=transcription_timeout(record_id, 30 * 60),
+                                     eta=transcription_eta(record_id))] = record_info
+
+    done_count = all_count - len(pending)
+    with tqdm(total=all_count, initial=done_count, desc=f"检测转写任务状态 {done_count} / {all_count}") as progress:
+        for future in as_completed(pending):
+            record_info = pending[future]
+            try:
+                future.result()
+            except PollError as e:
+                logging.error(f"{record_info['genRecordId']} 转写失败，请到网页查看详情。"
+                              f"{record_info['recordTitle']} 状态: {e.value.get('recordStatus')}")
+                progress.set_description(f"转写失败")
+                sys.exit(1)
+            except TimeoutError:
+                logging.error(f"转写任务超时未完成，请到网页查看详情")
+                sys.exit(1)
             done_count += 1
-            progress.set_description(f"导出转写任务 {done_count} / {record_count}")
+            progress.update(1)
+            progress.set_description(f"检测转写任务状态 {done_count} / {all_count}")
+        progress.set_description(f"转写任务已完成")
+    logging.info(f"已转写完成，准备导出")
+    failed_count = export_records([(record_info['recordTitle'], record_info['genRecordId'])
+                                   for record_info in record_list], concurrency)
+    failed_count += wait_deferred()
+    if failed_count > 0:
+        sys.exit(1)
     logging.info("get_latest_and_export 完成")
 
 
+def pop_option(args, name, default=None):
+    """从参数列表中取出 --name value 或 --name=value 形式的选项"""
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+        if arg.startswith(name + "="):
+            del args[i]
+            return arg[len(name) + 1:]
+    return default
+
+
 if __name__ == '__main__':
+    atexit.register(http_client.log_stats)
+    atexit.register(downloader.log_stats)
+    atexit.register(metrics.write_textfile)
     args = sys.argv[1:]
+    # 可选参数：--concurrency N 同时导出的记录数
+    concurrency = int(pop_option(args, "--concurrency", export_concurrency))
     if not args:
         # 功能1: 获取最新的一条转写任务并导出数据
         logging.info("获取最新的 1 条转写任务并导出数据")
-        get_latest_and_export(1)
+        get_latest_and_export(1, concurrency=concurrency)
     else:
         first_arg = args[0]
         if first_arg.isdigit():
             # 功能2: 获取最新的指定条转写任务并导出数据
             logging.info(f"获取最新的 {first_arg} 条转写任务并导出数据")
-            get_latest_and_export(int(first_arg))
+            get_latest_and_export(int(first_arg), concurrency=concurrency)
         elif first_arg == 'get_list_to_file':
-            # 功能3: 获取所有已完成转写任务并保存到 record_info.txt
+            # 功能3: 获取所有已完成转写任务并保存到 record_info.txt（--full 重新获取全部）
             logging.info("获取所有已完成的转写任务并保存到 record_info.txt")
-            get_list_to_file()
+            get_list_to_file('--full' in args)
         elif first_arg == 'export_from_text':
             # 功能4: 从 record_info.txt 中读取所有的 record_id_list 并导出数据
             logging.info("从 record_info.txt 中读取所有的 record_id_list 并导出数据")
-            export_from_text()
+            export_from_text(concurrency)
         else:
             # 功能5: 从指定名称导出数据（模糊查询，匹配第一个）
             logging.info(f"从指定名称导出数据：{first_arg}")
-            get_latest_and_export(1, first_arg)
+            get_latest_and_export(1, first_arg, concurrency)
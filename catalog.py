@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import sqlite3
+import threading
+from config import catalog_db, yt_list_info, log_level, log_format, log_datefmt
+
+# 播放列表目录（SQLite）：yt_list_tracker.js 导出的 yt_list_info.json 以增量 upsert 的方式导入，
+# 按视频 ID 查询开播日期、标题、时长只需一次索引查找；JSON 文件未变化时不再解析，启动开销不随列表增长
+
+# 音频文件名格式：开播日期_视频ID.扩展名
+VIDEO_FILE_PATTERN = r'^(\d{4}-\d{2}-\d{2})_([a-zA-Z0-9_-]{11})'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    href TEXT,
+    live_date TEXT,
+    duration INTEGER,
+    playlist_index INTEGER,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS videos_live_date ON videos (live_date);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    synced_at REAL
+);
+"""
+
+_lock = threading.Lock()
+_conn = None
+
+
+def connect():
+    """返回共享连接（多线程共用，由 _lock 串行化）"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(catalog_db, check_same_thread=False, isolation_level=None)
+            _conn.row_factory = sqlite3.Row
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA busy_timeout=10000")
+            _conn.executescript(_SCHEMA)
+        return _conn
+
+
+def parse_duration(value):
+    """'5:08:56' / '53:36' -> 秒，无法解析返回 None"""
+    try:
+        seconds = 0
+        for part in str(value).split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def sync(json_path=yt_list_info):
+    """
+    把 json_path 增量导入目录，返回 (新增数, 更新数)；文件大小和 mtime 未变化时直接跳过，
+    文件不存在或格式不正确时返回 None
+    """
+    if not os.path.exists(json_path):
+        logging.debug(f"未找到 JSON 文件：{json_path}，跳过目录同步")
+        return None
+    conn = connect()
+    path = os.path.abspath(json_path)
+    stat = os.stat(json_path)
+    with _lock:
+        source = conn.execute("SELECT size, mtime_ns FROM sources WHERE path = ?", (path,)).fetchone()
+    if source is not None and (source['size'], source['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return 0, 0
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        try:
+            yt_info_list = json.load(f)
+        except json.JSONDecodeError:
+            logging.debug(f"JSON 文件格式不正确：{json_path}")
+            return None
+
+    now = time.time()
+    rows = [(item['id'], item.get('title'), item.get('href'), item.get('liveDate'), parse_duration(item.get('time')),
+             int(item['index']) if str(item.get('index', '')).isdigit() else None, now)
+            for item in yt_info_list if item.get('id')]
+    with _lock:
+        before_count = conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        before_changes = conn.total_changes
+        conn.execute("BEGIN")
+        # 只有内容变化的条目才会被更新，changes 计数即为新增 + 更新
+        conn.executemany(
+            "INSERT INTO videos (id, title, href, live_date, duration, playlist_index, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET title = excluded.title, href = excluded.href, "
+            "live_date = excluded.live_date, duration = excluded.duration, playlist_index = excluded.playlist_index, "
+            "updated_at = excluded.updated_at WHERE title IS NOT excluded.title OR href IS NOT excluded.href "
+            "OR live_date IS NOT excluded.live_date OR duration IS NOT excluded.duration "
+            "OR playlist_index IS NOT excluded.playlist_index", rows)
+        changes = conn.total_changes - before_changes
+        conn.execute("INSERT OR REPLACE INTO sources (path, size, mtime_ns, synced_at) VALUES (?, ?, ?, ?)",
+                     (path, stat.st_size, stat.st_mtime_ns, now))
+        conn.execute("COMMIT")
+        added = conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0] - before_count
+        updated = changes - added
+    logging.info(f"目录同步完成 {json_path}: {len(rows)} 条，新增 {added}，更新 {updated}")
+    return added, updated
+
+
+def lookup(video_id):
+    """返回 {'id', 'title', 'live_date', 'duration', ...}，不存在返回 None"""
+    conn = connect()
+    with _lock:
+        row = conn.execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def live_date(video_id):
+    video = lookup(video_id)
+    return video['live_date'] if video else None
+
+
+def correct_date(episodes_dir: str, filename: str):
+    """文件名中的日期与目录中的开播日期不一致时重命名，返回（可能更新后的）文件名"""
+    match = re.match(VIDEO_FILE_PATTERN, filename)
+    if not match:
+        return filename  # 跳过不符合命名规则的文件
+
+    file_date_str, video_id = match.groups()
+    expected_date = live_date(video_id)
+
+    if not expected_date:
+        logging.info(f"找不到 ID {video_id} 的直播日期，跳过检测：{filename}")
+        return filename
+
+    if file_date_str != expected_date:
+        # 构建新文件名
+        new_filename = filename.replace(file_date_str, expected_date, 1)
+        old_path = os.path.join(episodes_dir, filename)
+        new_path = os.path.join(episodes_dir, new_filename)
+
+        # 重命名文件
+        os.rename(old_path, new_path)
+        logging.info(f"文件日期与开播日期不一致，已重命名：{filename} -> {new_filename}")
+        return new_filename
+    return filename
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
+    args = sys.argv[1:]
+    if args and args[0] == 'sync':
+        print(sync(*args[1:2]))
+    elif args:
+        for video_id in args:
+            print(lookup(video_id))
+    else:
+        print("用法: python catalog.py sync [yt_list_info.json] | python catalog.py 视频ID...")
@@ -1,41 +1,162 @@
 import os
 import sys
+import codecs
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import clean_srt_manifest, clean_srt_workers, srt_normalize_newlines, srt_source_encoding, log_level, \
+    log_format, log_datefmt
 
+# 清理导出的 _原文.srt 中的零宽字符（U+200B / U+200C）
+# 单次流式读写；按 (路径, 大小, mtime) 记录已处理的文件，未变化的文件直接跳过；文件多时使用进程池并行处理
 
-def clean_srt_files(root_path="."):
-    to_replace_1 = '\u200b'
-    to_replace_2 = '\u200c'
-    total_replacements = 0
+ZERO_WIDTH_TABLE = str.maketrans({'\u200b': None, '\u200c': None})
+
+SRT_SUFFIX = "_原文.srt"
+
+# 文件数超过该值时才启用进程池
+PARALLEL_THRESHOLD = 32
+
+_manifest_lock = threading.Lock()
+
+
+class SrtStreamFilter:
+    """
+    下载时使用的流式过滤器（bytes -> bytes）：去除零宽字符，输出统一为无 BOM 的 UTF-8，
+    可选统一换行符（newline 为 '\\n' 或 '\\r\\n'），跨块的多字节字符和 \\r\\n 也能正确处理
+    """
+
+    def __init__(self, newline=srt_normalize_newlines, encoding=srt_source_encoding):
+        self.newline = newline
+        self.encoding = encoding
+        self.removed = 0
+        self._decoder = None
+        self._head = b""
+        self._pending_cr = ""
+
+    def _detect_decoder(self, head):
+        for bom, encoding in [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+                              (codecs.BOM_UTF16_BE, 'utf-16')]:
+            if head.startswith(bom):
+                return codecs.getincrementaldecoder(encoding)()
+        return codecs.getincrementaldecoder(self.encoding)()
+
+    def _process(self, text, final=False):
+        new_text = text.translate(ZERO_WIDTH_TABLE)
+        self.removed += len(text) - len(new_text)
+        if self.newline:
+            new_text = self._pending_cr + new_text
+            self._pending_cr = ""
+            if new_text.endswith("\r") and not final:
+                # 可能是被分到两块的 \r\n，留到下一块再处理
+                new_text, self._pending_cr = new_text[:-1], "\r"
+            new_text = new_text.replace("\r\n", "\n").replace("\r", "\n")
+            if self.newline != "\n":
+                new_text = new_text.replace("\n", self.newline)
+        return new_text.encode("utf-8")
+
+    def feed(self, data):
+        if self._decoder is None:
+            # 积累到足够判断 BOM 的长度
+            self._head += data
+            if len(self._head) < 3:
+                return b""
+            self._decoder = self._detect_decoder(self._head)
+            data, self._head = self._head, b""
+        return self._process(self._decoder.decode(data))
+
+    def flush(self):
+        if self._decoder is None:
+            self._decoder = self._detect_decoder(self._head)
+            return self._process(self._decoder.decode(self._head, final=True), final=True)
+        return self._process(self._decoder.decode(b"", final=True), final=True)
+
+
+def clean_srt_file(file_path):
+    """清理单个文件，返回 (替换的字符数, 文件字节数)"""
+    count = 0
+    tmp_path = file_path + ".tmp"
+    with open(file_path, "r", encoding="utf-8", newline="") as src, \
+            open(tmp_path, "w", encoding="utf-8", newline="") as dst:
+        for line in src:
+            new_line = line.translate(ZERO_WIDTH_TABLE)
+            count += len(line) - len(new_line)
+            dst.write(new_line)
+    if count > 0:
+        os.replace(tmp_path, file_path)
+    else:
+        os.remove(tmp_path)
+    return count, os.path.getsize(file_path)
+
+
+def _file_key(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_manifest():
+    try:
+        with open(clean_srt_manifest, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(manifest):
+    tmp_path = clean_srt_manifest + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, clean_srt_manifest)
 
+
+def clean_srt_files(root_path=".", workers=clean_srt_workers):
+    start_time = time.monotonic()
+    with _manifest_lock:
+        manifest = _load_manifest()
+
+    file_paths = []
+    skipped = 0
     for dirpath, _, filenames in os.walk(root_path):
         for filename in filenames:
-            if filename.endswith("_原文.srt"):
-                file_path = os.path.join(dirpath, filename)
-                print(f"处理文件: {file_path}")
-
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                count_1 = content.count(to_replace_1)
-                count_2 = content.count(to_replace_2)
-                count = count_1 + count_2
-                if count > 0:
-                    new_content = content.replace(to_replace_1, "")
-                    new_content = new_content.replace(to_replace_2, "")
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(new_content)
-                    total_replacements += count
-                    print(f"已替换 {count} 个目标字符。")
+            if filename.endswith(SRT_SUFFIX):
+                file_path = os.path.abspath(os.path.join(dirpath, filename))
+                if manifest.get(file_path) == _file_key(file_path):
+                    skipped += 1
                 else:
-                    print("未发现目标字符，无需替换。")
+                    file_paths.append(file_path)
+
+    total_replacements = 0
+    total_bytes = 0
+    if len(file_paths) > PARALLEL_THRESHOLD and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(clean_srt_file, file_paths, chunksize=16))
+    else:
+        results = [clean_srt_file(file_path) for file_path in file_paths]
+    for file_path, (count, size) in zip(file_paths, results):
+        logging.debug(f"处理文件: {file_path}，替换 {count} 个目标字符")
+        total_replacements += count
+        total_bytes += size
+
+    with _manifest_lock:
+        manifest = _load_manifest()
+        for file_path in file_paths:
+            manifest[file_path] = _file_key(file_path)
+        _save_manifest(manifest)
 
-    print(f"\n总共替换了 {total_replacements} 个目标字符。")
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+    logging.info(f"清理 srt 完成 {root_path}: 处理 {len(file_paths)} 个文件，跳过未变化的 {skipped} 个，"
+                 f"共替换 {total_replacements} 个目标字符，用时 {elapsed:.2f}s，"
+                 f"{len(file_paths) / elapsed:.1f} 个/s，{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s")
+    return total_replacements
 
 
 # 示例调用
 if __name__ == "__main__":
+    logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
     if len(sys.argv) != 2:
-        print("使用当前目录")
+        logging.info("使用当前目录")
         clean_srt_files()
     else:
         clean_srt_files(sys.argv[1])
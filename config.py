@@ -1,15 +1,76 @@
+import os
 import logging
 
 # 配置文件
 # 音频文件存放位置
 episodes_dir = 'audio/'
 
+# 已上传音频的归档位置
+history_dir = 'history/'
+
 # 导出结果存放位置
 result_dir = 'result/'
 
+# 跳过内容（或视频 ID）与已转写音频相同的文件：podcast_server.py 不发布，podcast_upload.py、pipeline.py 不提交（见 dedupe.py）
+dedupe_audio = True
+
+# 批次清单存放位置，每次上传在 podcast_url 下发布 <batch_id>/ 的独立 feed（见 batches.py）
+batches_dir = 'batches/'
+
+# 把音频转码为适合语音识别的低码率单声道音频再发布（需要 ffmpeg），缩短通义拉取音频的时间（见 transcode.py）：
+# None 不转码；feed 只发布已转码完成的文件，完成前发布原文件：'background' 上传前先完成转码；'on_request' feed 被请求时才开始后台转码
+transcode_mode = None
+# 转码格式（'opus' 或 'aac'）和码率
+transcode_format = 'opus'
+transcode_bitrate = '32k'
+# 转码结果缓存位置和大小上限（字节），超过时删除最久未使用的文件
+transcode_cache_dir = 'transcoded/'
+transcode_cache_max_bytes = 20 * 1024 ** 3
+# 后台转码的并发数
+transcode_workers = 2
+
+# 要下载的 youtube 播放列表（pipeline.py 使用）
+playlist_url = 'https://www.youtube.com/playlist?list=PLi3zrmUZHiY-eH8eNJiwj-viwP3ngIkcd'
+
+# 音频最大时长（秒），超过则截取
+max_duration = 21599
+
+# 超过 max_duration 的音频是否切分为多段分别转写（False 则只截取前 max_duration 秒）
+segment_long_audio = True
+# 每段的目标时长（秒）
+segment_seconds = 7200
+# 是否在目标切分点之前 silence_search_seconds 秒内寻找静音处切分，避免把一句话切断
+segment_at_silence = False
+silence_noise_db = -35
+silence_min_seconds = 0.5
+silence_search_seconds = 300
+
+# yt-dlp 下载失败的重试次数，ffprobe 检测时长的线程数
+download_retries = 2
+probe_workers = 4
+
+# pipeline.py 各阶段的并发数（可用 --concurrency download=2,export=4 覆盖）
+pipeline_concurrency = {
+    'download': 2,  # yt-dlp 下载
+    'probe': 2,  # 时长检测与截取
+    'upload': 1,  # 提交到通义
+    'transcribe': 16,  # 等待转写（只占用轮询，不占带宽）
+    'export': 2,  # 导出
+}
+
 # podcast 服务监听端口
 port = 55001
 
+# podcast 服务进程数：大于 1 时使用 gunicorn 多进程服务（需 pip install gunicorn），每个进程 server_threads 个线程
+server_workers = 1
+server_threads = 8
+
+# 音频文件的缓存时间（秒）
+episode_cache_max_age = 86400
+
+# 前置 nginx 时可设置为 internal location（如 '/protected_audio/'），由 nginx 通过 X-Accel-Redirect 发送音频
+x_accel_redirect_prefix = None
+
 # podcast 服务地址（必须使用域名，且解析ip是国内ip，否则会失败）
 podcast_url = f"http://你的域名:{port}/podcast/"
 
@@ -22,6 +83,59 @@ wait_mind_map_summary = True
 # 等待思维导图时间（分钟）
 wait_mind_map_summary_minutes = 30
 
+# 两阶段导出：转写完成后立即导出原文和字幕，导读、脑图在后台检测到思维导图生成后再导出
+split_export = True
+
+# 提交转写任务时每个请求包含的音频数，以及同时发送的请求数
+submit_chunk_size = 10
+submit_concurrency = 3
+
+# 同时进行的导出任务数（betch_export.py 可用 --concurrency 覆盖）
+export_concurrency = 1
+
+# 每个导出任务（exportTrans）包含的转写记录数
+export_batch_size = 20
+
+# get_list_to_file 每页的记录数与同时预取的页数
+record_list_page_size = 30
+record_list_prefetch = 3
+
+# 轮询间隔（秒）：(最短, 最长)。状态无变化时按 poll_backoff 倍数逐步拉长间隔，
+# 状态有变化或接近预计完成时间时回到最短间隔，poll_jitter 为随机抖动比例
+poll_intervals = {
+    'transcription': (15, 60),  # 转写状态
+    'mind_map': (15, 60),  # 思维导图
+    'export': (1, 5),  # 导出任务
+    'net_source_parse': (2, 10),  # podcast 音频列表解析
+}
+poll_backoff = 1.5
+poll_jitter = 0.2
+# 每小时音频的转写用时（秒），用于估算转写完成时间；本次运行已有实测值时使用实测的平均值
+transcription_seconds_per_audio_hour = 600
+# 转写等待的超时（秒）：取按时长估算的转写用时的 2 倍，不少于该值；音频时长未知时使用该值
+transcription_timeout_seconds = 100 * 20
+
+# 导出文件下载的块大小（字节）与同一条记录的并行下载数
+download_chunk_size = 1024 * 1024
+download_concurrency = 5
+
+# 下载 srt 字幕时统一换行符：None 保持原样，'\n' 或 '\r\n'；原始编码（带 BOM 时自动识别）
+srt_normalize_newlines = None
+srt_source_encoding = 'utf-8'
+
+# 已清理 srt 文件的记录（路径、大小、mtime），未变化的文件不再重复处理
+clean_srt_manifest = 'clean_srt_manifest.json'
+
+# 清理大量 srt 文件时使用的进程数
+clean_srt_workers = os.cpu_count() or 1
+
+# yt_list_tracker.js 导出的播放列表信息，及其导入后的目录库（按视频 ID 查询开播日期、标题、时长）
+yt_list_info = 'yt_list_info.json'
+catalog_db = 'catalog.db'
+
+# 导出结果的全文索引（search_index.py）
+search_db = 'search.db'
+
 # 需要导出的文件类型
 exportDetails = [
     {"docType": 1, "fileType": 3, "withSpeaker": True, "withTimeStamp": True},  # md格式 原文
@@ -31,6 +145,42 @@ exportDetails = [
     {"docType": 8, "fileType": 6},  # jpg格式 脑图
 ]
 
+# 轮询转写状态时每页查询的记录数与最多查询的页数（等待中的记录不在第一页时继续翻页）
+transcription_sweep_page_size = 50
+transcription_sweep_max_pages = 10
+
+# 通义接口地址，可用环境变量指向本地的 mock_tongyi_server.py（bench_pipeline.py 使用）
+tongyi_efficiency_host = os.environ.get('TONGYI_EFFICIENCY_HOST', 'https://tw-efficiency.biz.aliyun.com')
+tongyi_assistant_host = os.environ.get('TONGYI_ASSISTANT_HOST', 'https://qianwen.biz.aliyun.com')
+
+# 通义接口 HTTP 连接池大小（每个 host）
+http_pool_size = 10
+
+# 通义接口请求超时（秒）：(连接超时, 读取超时)
+http_timeout = (10, 60)
+
+# 5xx 或连接重置时的重试次数与指数退避系数（间隔为 backoff * 2^n 秒）
+http_retries = 3
+http_backoff_factor = 1
+
+# 通义接口限流（令牌桶）：按接口路径设置 (每秒请求数, 突发请求数)，未列出的接口使用 default；
+# 状态保存在 rate_limit_file 中，同时运行的多个脚本共享额度
+rate_limits = {
+    'default': (0.5, 2),
+    '/assistant/api/record/list': (1, 3),
+    '/assistant/api/record/list/poll': (1, 3),
+    '/api/lab/getAllLabInfo': (1, 3),
+}
+rate_limit_file = 'rate_limit.json'
+# 被限流后暂停的秒数：(首次, 最长)，连续被限流时翻倍
+rate_limit_backoff = (5, 120)
+
+# 命令行脚本退出时写入运行指标的目录（Prometheus 文本格式，<脚本名>.prom）
+metrics_dir = 'metrics/'
+
+# 流水线状态库（SQLite），记录上传、转写、导出进度，重跑时跳过已完成的步骤
+state_db = 'state.db'
+
 log_level = logging.INFO
 log_format = '%(asctime)s %(levelname)s: %(message)s'
 log_datefmt = '%Y-%m-%d %H:%M:%S'
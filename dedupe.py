@@ -0,0 +1,107 @@
+import os
+import re
+import sys
+import hashlib
+import logging
+import threading
+import job_store
+from transcode import file_hash
+from config import episodes_dir, history_dir, dedupe_audio
+
+# 已转写音频的去重索引：文件改名（check_date 修正日期）、从 history/ 移回或重新下载后，内容相同的音频不再提交转写。
+# 快速指纹为 (大小, 开头 1MB, 结尾 1MB) 的 sha1，命中后用完整的 sha256 确认；
+# 重新下载的文件字节可能不同，再按视频 ID（含分段后缀，不含日期）匹配
+# 用法: python dedupe.py index [目录 ...]（把已提交过的音频加入索引，默认 history/ 和 audio/）  或   python dedupe.py check 文件 ...
+
+SAMPLE_SIZE = 1024 * 1024
+
+# 与 catalog.VIDEO_FILE_PATTERN 相同的命名规则：开播日期_视频ID[_p分段]
+VIDEO_KEY_PATTERN = r'^\d{4}-\d{2}-\d{2}_([a-zA-Z0-9_-]{11}.*)$'
+
+_fingerprints = {}  # (路径, 大小, mtime) -> 快速指纹
+_lock = threading.Lock()
+
+
+def video_key(show_name):
+    """去掉日期后的文件名（视频 ID 及分段后缀），日期被修正后仍能匹配"""
+    match = re.match(VIDEO_KEY_PATTERN, show_name)
+    return match.group(1) if match else None
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _fingerprints.get(key)
+    if cached is not None:
+        return cached
+    sha1 = hashlib.sha1(str(stat.st_size).encode())
+    with open(path, 'rb') as f:
+        sha1.update(f.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+            sha1.update(f.read(SAMPLE_SIZE))
+    digest = sha1.hexdigest()
+    with _lock:
+        _fingerprints[key] = digest
+    return digest
+
+
+def remember(path, record_id):
+    """记录音频与转写记录的对应关系"""
+    show_name = os.path.splitext(os.path.basename(path))[0]
+    job_store.add_fingerprint(fingerprint(path), file_hash(path), video_key(show_name), record_id, show_name)
+
+
+def _usable(row):
+    record = job_store.get_record(row['record_id'])
+    # 转写失败的记录不算已转写
+    return record is None or record['status'] != job_store.FAILED_STATUS
+
+
+def find(path):
+    """内容或视频 ID 与已转写的音频相同时返回 {'record_id', 'show_name', ...}，否则返回 None"""
+    if not dedupe_audio or not os.path.isfile(path):
+        return None
+    candidates = [row for row in job_store.find_fingerprints(fingerprint=fingerprint(path)) if _usable(row)]
+    if candidates:
+        # 快速指纹相同的文件再用完整哈希确认
+        digest = file_hash(path)
+        for row in candidates:
+            if row['sha256'] == digest:
+                return row
+    key = video_key(os.path.splitext(os.path.basename(path))[0])
+    if key is not None:
+        for row in job_store.find_fingerprints(video_key=key):
+            if _usable(row):
+                return row
+    return None
+
+
+def index(directories):
+    """把状态库中已有 record_id 的音频加入索引，返回加入的文件数"""
+    count = 0
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            audio = job_store.get_audio(os.path.splitext(filename)[0])
+            if filename.startswith('.') or not os.path.isfile(path) or audio is None or not audio['record_id']:
+                continue
+            remember(path, audio['record_id'])
+            count += 1
+    logging.info(f"去重索引加入 {count} 个音频")
+    return count
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == 'index':
+        index(sys.argv[2:] or [history_dir, episodes_dir])
+    elif len(sys.argv) > 2 and sys.argv[1] == 'check':
+        for target in sys.argv[2:]:
+            known = find(target)
+            print(f"{target}\t{known['show_name']}\t{known['record_id']}" if known else f"{target}\t未转写过")
+    else:
+        print("用法: python dedupe.py index [目录 ...] | python dedupe.py check 文件 ...")
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import logging
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+import http_client
+import job_store
+import metrics
+from clean_srt import SrtStreamFilter, SRT_SUFFIX
+from config import download_chunk_size, download_concurrency
+
+# 导出文件下载：大块流式写入 .part 临时文件，完成后原子重命名；
+# 存在 .part 时使用 HTTP Range 断点续传，并用 If-Range 带上 .part.meta 中保存的 ETag / Last-Modified，文件已变化时服务端返回完整内容；同一条记录的多个文件并行下载；
+# _原文.srt 在写入时即过滤零宽字符，落盘即为最终文件，无需再单独清理；
+# 已下载过的文件记录 ETag / Last-Modified / 大小，再次导出时发条件请求，未变化的文件不再下载
+
+_stats = {'downloaded': 0, 'downloaded_bytes': 0, 'skipped': 0, 'skipped_bytes': 0}
+_stats_lock = threading.Lock()
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def file_name_from_url(url):
+    file_name = url.split("UTF-8%27%27")[-1]
+    file_name = urllib.parse.unquote(file_name)
+    return urllib.parse.unquote(file_name)
+
+
+def _count(kind, size):
+    with _stats_lock:
+        _stats[kind] += 1
+        _stats[kind + '_bytes'] += size
+
+
+def get_stats():
+    """返回本次运行的 {'downloaded', 'downloaded_bytes', 'skipped', 'skipped_bytes'}"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def log_stats():
+    stats = get_stats()
+    if stats['downloaded'] or stats['skipped']:
+        logging.info(f"导出文件下载统计: 下载 {stats['downloaded']} 个 {format_size(stats['downloaded_bytes'])}，"
+                     f"未变化跳过 {stats['skipped']} 个 {format_size(stats['skipped_bytes'])}")
+
+
+def known_download(target, filtered):
+    """
+    本地已有完整文件时返回上次下载的记录（没有记录时用文件大小代替），本地文件被改动过时返回 None；
+    srt 过滤后的大小与服务端不同，没有记录时无法判断
+    """
+    if not os.path.exists(target):
+        return None
+    size = os.path.getsize(target)
+    known = job_store.get_download(target)
+    if known is not None:
+        return known if known['size'] == size else None
+    return None if filtered else {'etag': None, 'last_modified': None, 'content_length': size, 'size': size}
+
+
+def unchanged(response, known):
+    """服务端文件与本地记录一致（304，或 ETag / Content-Length 相同）"""
+    if response.status_code == 304:
+        return True
+    if response.status_code != 200:
+        return False
+    etag = response.headers.get('ETag')
+    if etag and known['etag']:
+        return etag == known['etag']
+    length = None if response.headers.get('Content-Encoding') else response.headers.get('Content-Length')
+    return length is not None and known['content_length'] is not None and int(length) == known['content_length']
+
+
+def _load_validator(part):
+    """返回开始写入 .part 时服务端的 ETag（弱 ETag 不能用于 If-Range）或 Last-Modified，没有时返回 None"""
+    try:
+        with open(part + '.meta', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    etag = meta.get('etag')
+    return etag if etag and not etag.startswith('W/') else meta.get('last_modified')
+
+
+def _save_validator(part, etag, last_modified):
+    with open(part + '.meta', 'w', encoding='utf-8') as f:
+        json.dump({'etag': etag, 'last_modified': last_modified}, f)
+
+
+def _remove_part(part):
+    for path in (part, part + '.meta'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(url, file_path, chunk_size=download_chunk_size):
+    """下载 url 到 file_path 目录，使用 URL 中的文件名，返回最终文件路径；本地文件未变化时跳过下载"""
+    os.makedirs(file_path, exist_ok=True)  # 创建文件夹
+    file_name = file_name_from_url(url)
+    target = os.path.join(file_path, file_name)
+    part = target + ".part"
+    srt_filter = SrtStreamFilter() if file_name.endswith(SRT_SUFFIX) else None
+
+    # 过滤后的内容与服务端字节不再一一对应，无法续传
+    if srt_filter is not None:
+        _remove_part(part)
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    validator = _load_validator(part) if offset > 0 else None
+    if offset > 0 and validator is None:
+        # 不知道 .part 对应服务端哪个版本，续传可能拼接出新旧混合的文件
+        logging.info(f"{file_name} 的临时文件没有校验信息，重新下载")
+        _remove_part(part)
+        offset = 0
+    request_headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset > 0 else {}
+    known = known_download(target, srt_filter is not None) if offset == 0 else None
+    if known is not None:
+        # 条件请求：服务端支持时未变化的文件返回 304，不传输内容
+        if known['etag']:
+            request_headers['If-None-Match'] = known['etag']
+        if known['last_modified']:
+            request_headers['If-Modified-Since'] = known['last_modified']
+    start_time = time.monotonic()
+    written = 0
+    with http_client.get(url, stream=True, headers=request_headers) as response:
+        if known is not None and unchanged(response, known):
+            job_store.set_download(target, response.headers.get('ETag') or known['etag'],
+                                   response.headers.get('Last-Modified') or known['last_modified'],
+                                   known['content_length'])
+            _count('skipped', known['size'])
+            metrics.DOWNLOAD_SKIPPED_BYTES.inc(known['size'])
+            logging.info(f"未变化，跳过下载 {file_name} {format_size(known['size'])}")
+            return target
+        if offset > 0 and response.status_code == 416:
+            # 服务端不接受该 Range（文件已变化），丢弃临时文件重新下载
+            logging.info(f"无法续传 {file_name}，重新下载")
+            _remove_part(part)
+            return download_file(url, file_path, chunk_size)
+        response.raise_for_status()
+        content_range = response.headers.get('Content-Range', '')
+        if offset > 0 and response.status_code == 206 and content_range.startswith(f'bytes {offset}-'):
+            mode = 'ab'
+            logging.info(f"断点续传 {file_name}，已下载 {format_size(offset)}")
+        else:
+            mode = 'wb'
+            offset = 0
+        # 压缩传输时 Content-Length 为压缩后大小，无法用于校验
+        expected = None if response.headers.get('Content-Encoding') else response.headers.get('Content-Length')
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if mode == 'wb' and srt_filter is None:
+            _save_validator(part, etag, last_modified)
+        with open(part, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                written += len(chunk)
+                f.write(srt_filter.feed(chunk) if srt_filter is not None else chunk)
+            if srt_filter is not None:
+                f.write(srt_filter.flush())
+
+    if expected is not None and written != int(expected):
+        raise IOError(f"{file_name} 下载不完整: {written} / {expected} bytes，保留临时文件以便续传")
+    os.replace(part, target)
+    _remove_part(part)
+    job_store.set_download(target, etag, last_modified, offset + written if expected is not None else None)
+    if srt_filter is not None and srt_filter.removed > 0:
+        logging.info(f"{file_name} 已去除 {srt_filter.removed} 个零宽字符")
+
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+    metrics.DOWNLOAD_BYTES.inc(written)
+    _count('downloaded', written)
+    metrics.DOWNLOAD_SECONDS.observe(elapsed)
+    logging.info(f"下载完成 {file_name} {format_size(offset + written)}，"
+                 f"本次 {format_size(written)} 用时 {elapsed:.2f}s，{format_size(written / elapsed)}/s")
+    return target
+
+
+def download_all(urls, file_path, max_workers=download_concurrency, desc=None):
+    """并行下载多个 url 到同一目录，返回 {url: 文件路径 | Exception}"""
+    results = {}
+    if not urls:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls))), thread_name_prefix="download") as executor:
+        futures = {executor.submit(download_file, url, file_path): url for url in urls}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc, unit="个"):
+            url = futures[future]
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                logging.error(f"下载失败 {file_name_from_url(url)}: {e}")
+                results[url] = e
+    return results
@@ -0,0 +1,120 @@
+import logging
+import threading
+import urllib.parse
+import requests
+import metrics
+import rate_limiter
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from config import headers, http_pool_size, http_timeout, http_retries, http_backoff_factor
+
+# 通义接口共用的 HTTP 客户端：每个 host 一个带连接池的 Session，复用 keep-alive 连接，
+# 对 5xx 和连接重置按指数退避重试，并统计新建连接（握手）与复用次数；post 请求经过 rate_limiter 限流。
+# 提交转写、导出等有副作用的 POST 只在连接失败（请求未发出）时重试，读超时或 5xx 时服务端可能已经执行，
+# 重发会重复提交；只读的查询接口传 idempotent=True，与 GET 下载一样对读超时和 5xx 也重试
+
+_stats_lock = threading.Lock()
+_stats = {}
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _count(host, key):
+    with _stats_lock:
+        host_stats = _stats.setdefault(host, {"requests": 0, "handshakes": 0})
+        host_stats[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count(self.host, "handshakes")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count(self.host, "handshakes")
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, timeout=http_timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        _count(urllib.parse.urlsplit(request.url).hostname, "requests")
+        return super().send(request, **kwargs)
+
+
+def _build_session(idempotent=True):
+    retry = Retry(
+        total=http_retries,
+        connect=http_retries,
+        read=http_retries if idempotent else 0,
+        status=http_retries if idempotent else 0,
+        other=http_retries if idempotent else 0,
+        backoff_factor=http_backoff_factor,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=None,  # 只读的 POST 查询同样需要重试
+        raise_on_status=False,  # 重试耗尽后返回最后一次响应，由调用方按 status_code 处理
+    )
+    adapter = PooledAdapter(pool_connections=1, pool_maxsize=http_pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url, idempotent=True):
+    """按 host 和是否可重发获取共享的 Session（线程安全，requests.Session 可在线程间共用）"""
+    key = (urllib.parse.urlsplit(url).hostname, idempotent)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session(idempotent)
+            _sessions[key] = session
+        return session
+
+
+def post(url, json=None, idempotent=False, **kwargs):
+    """idempotent=False（默认）时只在连接失败时重试，只读查询传 True"""
+    kwargs.setdefault("headers", headers)
+    rate_limiter.acquire(url)
+    response = get_session(url, idempotent).post(url, json=json, **kwargs)
+    metrics.HTTP_RESPONSES.inc(host=urllib.parse.urlsplit(url).hostname, code=response.status_code)
+    rate_limiter.report(url, response)
+    return response
+
+
+def get(url, **kwargs):
+    return get_session(url).get(url, **kwargs)
+
+
+def get_stats():
+    """返回 {host: {"requests": n, "handshakes": n, "reused": n}}"""
+    with _stats_lock:
+        return {host: dict(s, reused=max(0, s["requests"] - s["handshakes"])) for host, s in _stats.items()}
+
+
+def log_stats():
+    for host, s in get_stats().items():
+        logging.info(f"HTTP 连接统计 {host}: 请求 {s['requests']} 次，新建连接 {s['handshakes']} 次，复用 {s['reused']} 次")
+    rate_limiter.log_stats()
+
+
+def close():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
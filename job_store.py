@@ -0,0 +1,253 @@
+import os
+import time
+import sqlite3
+import threading
+from config import state_db
+
+# 流水线状态库（SQLite）：记录每个音频文件、通义 taskId / recordId、转写状态、导出任务和已导出的文件，
+# podcast_upload.py 和 betch_export.py 据此跳过已完成的步骤，失败后重跑只需继续未完成的部分
+
+# 记录的处理进度，只会向前推进；
+# 两阶段导出时原文、字幕导出后为 transcript_exported，导读、脑图导出后为 exported
+STEPS = ['submitted', 'transcribed', 'mind_map_ready', 'export_requested', 'transcript_exported', 'exported']
+
+# 通义转写失败的记录状态（recordStatus）
+FAILED_STATUS = 40
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio (
+    show_name TEXT PRIMARY KEY,
+    audio_file TEXT,
+    video_id TEXT,
+    task_id TEXT,
+    file_id TEXT,
+    record_id TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    record_id TEXT PRIMARY KEY,
+    title TEXT,
+    status INTEGER,
+    step TEXT,
+    export_task_id TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS probes (
+    file_name TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    duration REAL,
+    PRIMARY KEY (file_name, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS segments (
+    part_title TEXT PRIMARY KEY,
+    source_title TEXT,
+    part_index INTEGER,
+    part_count INTEGER,
+    offset_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS segments_source ON segments (source_title);
+CREATE TABLE IF NOT EXISTS artifacts (
+    record_id TEXT,
+    file_name TEXT,
+    path TEXT,
+    size INTEGER,
+    updated_at REAL,
+    PRIMARY KEY (record_id, file_name)
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT,
+    sha256 TEXT,
+    video_key TEXT,
+    record_id TEXT,
+    show_name TEXT,
+    updated_at REAL,
+    PRIMARY KEY (fingerprint, record_id)
+);
+CREATE INDEX IF NOT EXISTS fingerprints_video ON fingerprints (video_key);
+CREATE TABLE IF NOT EXISTS downloads (
+    path TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_length INTEGER,
+    size INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    file_name TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    PRIMARY KEY (file_name, size, mtime_ns)
+);
+"""
+
+_lock = threading.Lock()
+_conn = None
+
+
+def connect():
+    """返回共享连接（多线程共用，写操作由 _lock 串行化）"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(state_db, check_same_thread=False, isolation_level=None)
+            _conn.row_factory = sqlite3.Row
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA busy_timeout=10000")
+            _conn.executescript(_SCHEMA)
+        return _conn
+
+
+def _execute(sql, params=()):
+    conn = connect()
+    with _lock:
+        return conn.execute(sql, params).fetchall()
+
+
+def _row(rows):
+    return dict(rows[0]) if rows else None
+
+
+def add_audio(audio_file, video_id=None):
+    show_name = os.path.splitext(os.path.basename(audio_file))[0]
+    _execute("INSERT INTO audio (show_name, audio_file, video_id, updated_at) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT(show_name) DO UPDATE SET audio_file = excluded.audio_file, "
+             "video_id = COALESCE(excluded.video_id, video_id), updated_at = excluded.updated_at",
+             (show_name, audio_file, video_id, time.time()))
+
+
+def update_audio(show_name, task_id=None, file_id=None, record_id=None):
+    _execute("INSERT INTO audio (show_name, task_id, file_id, record_id, updated_at) VALUES (?, ?, ?, ?, ?) "
+             "ON CONFLICT(show_name) DO UPDATE SET task_id = COALESCE(excluded.task_id, task_id), "
+             "file_id = COALESCE(excluded.file_id, file_id), record_id = COALESCE(excluded.record_id, record_id), "
+             "updated_at = excluded.updated_at",
+             (show_name, task_id, file_id, record_id, time.time()))
+
+
+def get_audio(show_name):
+    return _row(_execute("SELECT * FROM audio WHERE show_name = ?", (show_name,)))
+
+
+def submitted_record_id(show_name):
+    """返回音频已提交且未转写失败的 record_id；此前转写失败时清除该 record_id 并返回 None，以便重新提交"""
+    audio = get_audio(show_name)
+    if audio is None or not audio['record_id']:
+        return None
+    record = get_record(audio['record_id'])
+    if record is not None and record['status'] == FAILED_STATUS:
+        _execute("UPDATE audio SET record_id = NULL, updated_at = ? WHERE show_name = ?", (time.time(), show_name))
+        return None
+    return audio['record_id']
+
+
+def get_audio_by_record(record_id):
+    return _row(_execute("SELECT * FROM audio WHERE record_id = ? ORDER BY updated_at DESC", (record_id,)))
+
+
+def advance_record(record_id, step=None, title=None, status=None, export_task_id=None):
+    """更新记录信息，step 只会向前推进"""
+    current = get_record(record_id)
+    if current is not None and step is not None and current['step'] in STEPS \
+            and STEPS.index(current['step']) >= STEPS.index(step):
+        step = None
+    _execute("INSERT INTO records (record_id, title, status, step, export_task_id, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+             "ON CONFLICT(record_id) DO UPDATE SET title = COALESCE(excluded.title, title), "
+             "status = COALESCE(excluded.status, status), step = COALESCE(excluded.step, step), "
+             "export_task_id = COALESCE(excluded.export_task_id, export_task_id), updated_at = excluded.updated_at",
+             (record_id, title, status, step, export_task_id, time.time()))
+
+
+def get_record(record_id):
+    return _row(_execute("SELECT * FROM records WHERE record_id = ?", (record_id,)))
+
+
+def get_record_by_title(title):
+    return _row(_execute("SELECT * FROM records WHERE title = ? ORDER BY updated_at DESC LIMIT 1", (title,)))
+
+
+def reached(record, step):
+    """record 是否已完成 step"""
+    return record is not None and record['step'] in STEPS and STEPS.index(record['step']) >= STEPS.index(step)
+
+
+def get_probe(file_name, size, mtime_ns):
+    rows = _execute("SELECT duration FROM probes WHERE file_name = ? AND size = ? AND mtime_ns = ?",
+                    (file_name, size, mtime_ns))
+    return rows[0]['duration'] if rows else None
+
+
+def set_probe(file_name, size, mtime_ns, duration):
+    _execute("INSERT OR REPLACE INTO probes (file_name, size, mtime_ns, duration) VALUES (?, ?, ?, ?)",
+             (file_name, size, mtime_ns, duration))
+
+
+def get_hash(file_name, size, mtime_ns):
+    rows = _execute("SELECT sha256 FROM hashes WHERE file_name = ? AND size = ? AND mtime_ns = ?",
+                    (file_name, size, mtime_ns))
+    return rows[0]['sha256'] if rows else None
+
+
+def set_hash(file_name, size, mtime_ns, sha256):
+    _execute("INSERT OR REPLACE INTO hashes (file_name, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+             (file_name, size, mtime_ns, sha256))
+
+
+def add_fingerprint(fingerprint, sha256, video_key, record_id, show_name):
+    _execute("INSERT OR REPLACE INTO fingerprints (fingerprint, sha256, video_key, record_id, show_name, updated_at) "
+             "VALUES (?, ?, ?, ?, ?, ?)", (fingerprint, sha256, video_key, record_id, show_name, time.time()))
+
+
+def find_fingerprints(fingerprint=None, video_key=None):
+    """按快速指纹或视频 key 查询已转写的音频，最近的在前"""
+    column, value = ('fingerprint', fingerprint) if fingerprint is not None else ('video_key', video_key)
+    return [dict(row) for row in _execute(f"SELECT * FROM fingerprints WHERE {column} = ? ORDER BY updated_at DESC",
+                                          (value,))]
+
+
+def fingerprints_version():
+    """去重索引有新增时变化"""
+    row = _execute("SELECT COUNT(*) AS count, MAX(updated_at) AS updated_at FROM fingerprints")[0]
+    return row['count'], row['updated_at']
+
+
+def add_segments(source_title, parts):
+    """parts 为 [(part_title, offset_seconds), ...]，按顺序编号"""
+    for index, (part_title, offset) in enumerate(parts, 1):
+        _execute("INSERT OR REPLACE INTO segments (part_title, source_title, part_index, part_count, offset_seconds) "
+                 "VALUES (?, ?, ?, ?, ?)", (part_title, source_title, index, len(parts), offset))
+
+
+def get_segment(part_title):
+    return _row(_execute("SELECT * FROM segments WHERE part_title = ?", (part_title,)))
+
+
+def get_segments(source_title):
+    return [dict(row) for row in _execute("SELECT * FROM segments WHERE source_title = ? ORDER BY part_index",
+                                          (source_title,))]
+
+
+def add_artifact(record_id, path):
+    _execute("INSERT OR REPLACE INTO artifacts (record_id, file_name, path, size, updated_at) VALUES (?, ?, ?, ?, ?)",
+             (record_id, os.path.basename(path), path, os.path.getsize(path), time.time()))
+
+
+def get_artifacts(record_id):
+    return [dict(row) for row in _execute("SELECT * FROM artifacts WHERE record_id = ?", (record_id,))]
+
+
+def get_download(path):
+    return _row(_execute("SELECT * FROM downloads WHERE path = ?", (path,)))
+
+
+def set_download(path, etag, last_modified, content_length):
+    """记录下载文件的 ETag / Last-Modified / 服务端大小，以及写入磁盘后的大小（srt 过滤后可能不同）"""
+    _execute("INSERT OR REPLACE INTO downloads (path, etag, last_modified, content_length, size, updated_at) "
+             "VALUES (?, ?, ?, ?, ?, ?)", (path, etag, last_modified, content_length, os.path.getsize(path), time.time()))
+
+
+def artifacts_intact(record_id):
+    """已导出的文件是否都还在磁盘上且大小未变"""
+    artifacts = get_artifacts(record_id)
+    return len(artifacts) > 0 and all(
+        os.path.exists(a['path']) and os.path.getsize(a['path']) == a['size'] for a in artifacts)
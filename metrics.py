@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import functools
+import threading
+from config import metrics_dir
+
+# 运行指标（Prometheus 文本格式）：接口耗时与结果、轮询次数、下载字节数与耗时、转写耗时、podcast 服务请求数。
+# podcast_server.py 在 /metrics 提供；命令行脚本退出时写入 metrics_dir/<脚本名>.prom，
+# 可由 node_exporter 的 textfile collector 收集，或直接对比多次运行的结果
+# gunicorn 多进程时每个进程各自统计，/metrics 只返回处理该请求的进程的数据
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Counter:
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            counts, total, observed = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observed + 1)
+
+    def mean(self, **labels):
+        """已记录值的平均值，没有记录时返回 None"""
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            _, total, observed = self._values.get(key, (None, 0.0, 0))
+        return total / observed if observed else None
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, observed) in sorted(self._values.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {observed}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {observed}")
+        return lines
+
+
+API_SECONDS = Histogram('tongyi_api_seconds', '通义接口调用耗时（秒）', ['function', 'status'])
+HTTP_RESPONSES = Counter('tongyi_http_responses_total', '通义接口 HTTP 响应数', ['host', 'code'])
+RATE_LIMIT_WAIT = Counter('tongyi_rate_limit_wait_seconds_total', '限流等待时间（秒）', ['endpoint'])
+POLL_SWEEPS = Counter('poll_sweeps_total', '轮询查询次数', ['kind'])
+POLL_ITERATIONS = Histogram('poll_iterations_per_key', '每条记录等待完成前的轮询次数', ['kind', 'result'],
+                            buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200))
+POLL_WAIT_SECONDS = Histogram('poll_wait_seconds', '每条记录的等待时间（秒）', ['kind', 'result'],
+                              buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+DOWNLOAD_BYTES = Counter('download_bytes_total', '导出文件下载字节数')
+DOWNLOAD_SKIPPED_BYTES = Counter('download_skipped_bytes_total', '未变化而跳过下载的导出文件字节数')
+DOWNLOAD_SECONDS = Histogram('download_seconds', '单个导出文件的下载耗时（秒）')
+TRANSCRIPTION_SECONDS_PER_AUDIO_HOUR = Histogram(
+    'transcription_seconds_per_audio_hour', '每小时音频的转写等待时间（秒）',
+    buckets=(60, 120, 180, 300, 450, 600, 900, 1200, 1800, 3600))
+SERVER_REQUESTS = Counter('podcast_server_requests_total', 'podcast 服务请求数', ['endpoint', 'code'])
+
+
+def track_api(func):
+    """记录接口函数的耗时，返回 None 或抛出异常时 status 为 error"""
+    name = f"{os.path.splitext(os.path.basename(func.__code__.co_filename))[0]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        status = 'error'
+        try:
+            result = func(*args, **kwargs)
+            if result is not None:
+                status = 'ok'
+            return result
+        finally:
+            API_SECONDS.observe(time.monotonic() - start, function=name, status=status)
+
+    return wrapper
+
+
+def render():
+    with _lock:
+        lines = [line for metric in _registry for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path=None):
+    """写入 metrics_dir/<脚本名>.prom（先写临时文件再替换，避免收集到写了一半的文件）"""
+    if path is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'python'
+        path = os.path.join(metrics_dir, f"{script}.prom")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,196 @@
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import itertools
+import urllib.parse
+from flask import Flask, request, jsonify, abort
+
+# 本地模拟的通义接口，用于离线测试和性能对比（bench_pipeline.py）：
+# 实现 podcast 解析、提交转写、转写列表、思维导图、导出和下载文件，可设置接口延迟、失败率和各任务的处理时间
+# 用法: python mock_tongyi_server.py [--port 55100] [--latency 0.02] [--failure-rate 0] [--transcribe-seconds 5]
+# 解析 podcast 地址时返回的音频数由地址中的 episodes 参数决定，如 http://example.com/podcast/?episodes=50
+
+app = Flask(__name__)
+
+settings = {
+    'latency': 0.02,  # 每个请求的平均延迟（秒），实际在 0.5 ~ 1.5 倍之间随机
+    'failure_rate': 0.0,  # 返回 503 的比例
+    'parse_seconds': 1.0,  # podcast 解析时间
+    'transcribe_seconds': 5.0,  # 转写时间
+    'mind_map_seconds': 2.0,  # 转写完成后生成思维导图的时间
+    'export_seconds': 0.5,  # 导出任务准备时间
+}
+
+DOC_SUFFIXES = {(1, 3): '_原文.md', (1, 2): '_原文.srt', (7, 3): '_导读.md', (8, 3): '_脑图.md', (8, 6): '_脑图.jpg'}
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_parse_tasks = {}
+_records = {}  # record_id -> {'title', 'created', 'done_at'}
+_exports = {}
+_stats = {}
+
+
+def _new_id(prefix):
+    return f"{prefix}{next(_ids):08d}"
+
+
+def _ok(data):
+    return jsonify({'success': True, 'message': 'success', 'errorCode': None, 'data': data})
+
+
+@app.before_request
+def simulate_network():
+    with _lock:
+        _stats[request.path] = _stats.get(request.path, 0) + 1
+    if settings['latency'] > 0:
+        time.sleep(settings['latency'] * random.uniform(0.5, 1.5))
+    if request.method == 'POST' and random.random() < settings['failure_rate']:
+        abort(503)
+
+
+@app.route('/api/trans/parseNetSourceUrl', methods=['POST'])
+def parse_net_source_url():
+    podcast_url = request.get_json()['url']
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(podcast_url).query)
+    episodes = int(query.get('episodes', ['1'])[0])
+    task_id = _new_id('parse')
+    with _lock:
+        _parse_tasks[task_id] = {'ready_at': time.time() + settings['parse_seconds'], 'episodes': episodes,
+                                 'prefix': query.get('prefix', ['mock'])[0]}
+    return _ok({'taskId': task_id})
+
+
+@app.route('/api/trans/queryNetSourceParse', methods=['POST'])
+def query_net_source_parse():
+    task = _parse_tasks.get(request.get_json()['taskId'])
+    if task is None:
+        return jsonify({'success': False, 'message': 'task not found'})
+    if time.time() < task['ready_at']:
+        return _ok({'status': -1})
+    urls = [{'fileId': f"file_{task['prefix']}_{i:04d}", 'size': 1024 * 1024 * 100,
+             'showName': f"{task['prefix']}_{i:04d}"} for i in range(1, task['episodes'] + 1)]
+    return _ok({'status': 0, 'urls': urls})
+
+
+@app.route('/assistant/api/record/blog/start', methods=['POST'])
+def record_blog_start():
+    now = time.time()
+    record_ids = []
+    with _lock:
+        for file in request.get_json()['files']:
+            record_id = _new_id('rec')
+            _records[record_id] = {'title': file['tag']['showName'], 'created': now,
+                                   'done_at': now + settings['transcribe_seconds']}
+            record_ids.append(record_id)
+    return _ok({'recordIdList': record_ids})
+
+
+def _record_info(record_id, record, now):
+    return {'genRecordId': record_id, 'recordId': record_id, 'recordTitle': record['title'],
+            'recordStatus': 30 if now >= record['done_at'] else 20, 'recordTags': ['mock'],
+            'recordContent': f"{record['title']} 的摘要"}
+
+
+def _record_page(page_no, page_size):
+    now = time.time()
+    with _lock:
+        ordered = sorted(_records.items(), key=lambda item: item[1]['created'], reverse=True)
+    page = ordered[(page_no - 1) * page_size: page_no * page_size]
+    return {'batchRecord': [{'recordList': [_record_info(record_id, record, now) for record_id, record in page]}]
+            if page else []}
+
+
+@app.route('/assistant/api/record/list/poll', methods=['POST'])
+def record_list_poll():
+    payload = request.get_json()
+    return _ok(_record_page(payload.get('pageNo', 1), payload.get('pageSize', 10)))
+
+
+@app.route('/assistant/api/record/list', methods=['POST'])
+def record_list():
+    payload = request.get_json()
+    data = _record_page(payload.get('pageNo', 1), payload.get('pageSize', 10))
+    if payload.get('showName'):
+        data['batchRecord'] = [{'recordList': [r for batch in data['batchRecord'] for r in batch['recordList']
+                                               if payload['showName'] in r['recordTitle']]}]
+    return jsonify({'errorCode': None, 'data': data})
+
+
+@app.route('/api/lab/getAllLabInfo', methods=['POST'])
+def get_all_lab_info():
+    record = _records.get(request.get_json()['transId'])
+    if record is None:
+        return jsonify({'success': False, 'message': 'record not found'})
+    ready = time.time() >= record['done_at'] + settings['mind_map_seconds']
+    return _ok({'labCardsMap': {'labInfo': [{'key': 'mindMapSummary', 'contents': [{'content': 'mock'}] if ready else None}]}})
+
+
+@app.route('/api/export/request', methods=['POST'])
+def export_request():
+    payload = request.get_json()
+    if payload['action'] == 'exportTrans':
+        export_task_id = _new_id('export')
+        with _lock:
+            _exports[export_task_id] = {'ready_at': time.time() + settings['export_seconds'],
+                                        'trans_ids': payload['transIds'], 'details': payload['exportDetails']}
+        return _ok({'exportTaskId': export_task_id})
+
+    export = _exports.get(payload['exportTaskId'])
+    if export is None or time.time() < export['ready_at']:
+        return _ok({'exportStatus': 0})
+    export_urls = []
+    for trans_id in export['trans_ids']:
+        record = _records.get(trans_id)
+        if record is None:
+            continue
+        for detail in export['details']:
+            suffix = DOC_SUFFIXES.get((detail['docType'], detail['fileType']), '.txt')
+            file_name = urllib.parse.quote(urllib.parse.quote(f"{record['title']}{suffix}"))
+            url = (f"{request.host_url}download/{trans_id}/{detail['docType']}/{detail['fileType']}"
+                   f"?response-content-disposition=attachment%3Bfilename%2A%3DUTF-8%27%27{file_name}")
+            export_urls.append({'url': url, 'success': True, 'docType': detail['docType'],
+                                'fileType': detail['fileType'], 'transId': trans_id})
+    return _ok({'exportStatus': 1, 'exportUrls': export_urls})
+
+
+@app.route('/download/<record_id>/<int:doc_type>/<int:file_type>')
+def download(record_id, doc_type, file_type):
+    record = _records.get(record_id)
+    if record is None:
+        abort(404)
+    if file_type == 2:
+        body = "".join(f"{i}\n00:{i // 60:02d}:{i % 60:02d},000 --> 00:{i // 60:02d}:{i % 60:02d},900\n"
+                       f"{record['title']} 第 {i} 句\u200b字幕\n\n" for i in range(1, 200))
+    elif file_type == 6:
+        body = "\x89PNG mock image"
+    else:
+        body = f"# {record['title']}\n\n发言人1 00:01\n模拟的转写内容\n"
+    return body.encode('utf-8'), 200, {'Content-Type': 'application/octet-stream'}
+
+
+@app.route('/stats')
+def stats():
+    with _lock:
+        return jsonify({'requests': dict(_stats), 'records': len(_records)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的通义接口")
+    parser.add_argument('--port', type=int, default=55100)
+    for name, value in settings.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=float, default=value)
+    args = parser.parse_args(argv)
+    for name in settings:
+        settings[name] = getattr(args, name)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    logging.info(f"mock 通义接口启动: http://127.0.0.1:{args.port}/ {settings}")
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
@@ -0,0 +1,249 @@
+import os
+import re
+import sys
+import time
+import queue
+import shutil
+import socket
+import atexit
+import logging
+import threading
+import subprocess
+import http_client
+import job_store
+import metrics
+import batches
+import downloader
+import dedupe
+import transcode
+from acquire import download, check_duration, parse_items, list_audio
+from catalog import VIDEO_FILE_PATTERN
+from podcast_upload import parse_podcast, submit_transcriptions, wait_transcriptions
+from betch_export import export_from_record_id, wait_deferred, pop_option
+from config import episodes_dir, history_dir, port, pipeline_concurrency, transcode_mode
+
+# 流水线编排：下载 -> 时长检测 -> 上传 -> 转写 -> 导出，各阶段之间用队列连接、各自并发执行，
+# 第 1 个视频转写时第 2 个视频已在下载，第 1 个导出时第 3 个可能正在上传
+# 用法与 yt_list_to_srt.sh 相同: python pipeline.py [index | start-end | url] [--concurrency download=2,export=4]
+
+_STOP = object()
+
+
+class Stage:
+    """流水线中的一个阶段：concurrency 个线程从输入队列取任务，func 返回的结果（列表则逐个）送入下一阶段"""
+
+    def __init__(self, name, func, concurrency):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.next_stage = None
+        self.input = queue.Queue()
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        self.input.put(item)
+
+    def close(self):
+        """上游已全部送达后调用，等待本阶段处理完所有任务"""
+        for _ in self._threads:
+            self.input.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            item = self.input.get()
+            if item is _STOP:
+                return
+            start = time.monotonic()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logging.error(f"[{self.name}] 处理失败 {item}: {e}")
+                result = None
+            end = time.monotonic()
+            with self._lock:
+                self.first_start = start if self.first_start is None else min(self.first_start, start)
+                self.last_end = end if self.last_end is None else max(self.last_end, end)
+                self.busy_seconds += end - start
+                if result is None:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+            if result is None or self.next_stage is None:
+                continue
+            for output in (result if isinstance(result, list) else [result]):
+                self.next_stage.put(output)
+
+    def report(self):
+        done = self.processed + self.failed
+        wall = (self.last_end - self.first_start) if done else 0
+        average = self.busy_seconds / done if done else 0
+        rate = self.processed / wall * 3600 if wall > 0 else 0
+        return (f"{self.name:<10} 并发 {self.concurrency:<2} 完成 {self.processed:<3} 失败 {self.failed:<3} "
+                f"平均耗时 {average:.1f}s 阶段用时 {wall:.1f}s 吞吐 {rate:.1f} 个/小时")
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def run(self, items, first_stage=0):
+        """返回各阶段失败的任务数之和；长音频切分后一个输入对应多个任务，不能用完成数和输入数比较"""
+        start = time.monotonic()
+        for stage in self.stages:
+            stage.start()
+        for item in items:
+            self.stages[first_stage].put(item)
+        for stage in self.stages:
+            stage.close()
+        logging.info(f"流水线完成，总用时 {time.monotonic() - start:.1f}s")
+        for stage in self.stages:
+            logging.info(stage.report())
+        return sum(stage.failed for stage in self.stages)
+
+
+def upload(path):
+    """把音频提交到通义转写，返回 {'path', 'title', 'record_id'}"""
+    title = os.path.splitext(os.path.basename(path))[0]
+    match = re.match(VIDEO_FILE_PATTERN, os.path.basename(path))
+    job_store.add_audio(path, match.group(2) if match else None)
+    record_id = job_store.submitted_record_id(title)
+    if record_id is not None:
+        logging.info(f"[upload] {title} 此前已提交，Record ID: {record_id}")
+        return {'path': path, 'title': title, 'record_id': record_id}
+    known = dedupe.find(path)
+    if known is not None:
+        logging.info(f"[upload] {title} 与已转写的 {known['show_name']} 相同，跳过 Record ID: {known['record_id']}")
+        job_store.update_audio(title, record_id=known['record_id'])
+        return {'path': path, 'title': title, 'record_id': known['record_id']}
+
+    # 每个文件使用只包含自己的批次 feed，提交后 feed 不再需要（音频仍可通过 /podcast/music/ 下载）
+    batch_id = batches.create([path])
+    try:
+        if transcode_mode == 'background':
+            transcode.prepare([path])
+        parsed = parse_podcast(batches.feed_url(batch_id))
+        if parsed is None:
+            return None
+        task_id, urls = parsed
+        urls = [url_item for url_item in urls if url_item.get('showName') == title]
+        if not urls:
+            logging.error(f"[upload] podcast 中未找到 {title}")
+            return None
+        record_ids = submit_transcriptions(task_id, urls)
+    finally:
+        batches.remove(batch_id)
+    if not record_ids:
+        return None
+    return {'path': path, 'title': title, 'record_id': record_ids[0]}
+
+
+def transcribe(item):
+    """等待转写完成（转写用时由 wait_transcriptions 记入指标），完成后音频不再需要发布，移动到 history_dir"""
+    if not wait_transcriptions([item['record_id']]):
+        logging.error(f"[transcribe] {item['title']} 转写失败或超时，请到网页查看详情")
+        return None
+    if os.path.exists(item['path']):
+        shutil.move(item['path'], os.path.join(history_dir, os.path.basename(item['path'])))
+    return item
+
+
+def export(item):
+    return item if export_from_record_id(item['title'], item['record_id']) else None
+
+
+def parse_concurrency(value):
+    concurrency = dict(pipeline_concurrency)
+    for part in (value or '').split(','):
+        if '=' in part:
+            name, number = part.split('=', 1)
+            concurrency[name.strip()] = int(number)
+    return concurrency
+
+
+def start_podcast_server():
+    """podcast 服务未运行时在后台启动，返回进程（已运行则返回 None）"""
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1):
+            logging.info("podcast_server 已在运行")
+            return None
+    except OSError:
+        pass
+    log_file = open('podcast_server.log', 'a')
+    server = subprocess.Popen([sys.executable, 'podcast_server.py'], stdout=log_file, stderr=subprocess.STDOUT)
+    time.sleep(2)
+    if server.poll() is not None:
+        raise RuntimeError("启动 podcast_server 出错")
+    logging.info("podcast_server 启动完成")
+    return server
+
+
+def stop_podcast_server(server):
+    """结束本次启动的 podcast 服务；其他上传的批次仍在发布时保持运行"""
+    if server is None:
+        return
+    active = batches.list_batches()
+    if active:
+        logging.info(f"仍有 {len(active)} 个批次在发布，podcast_server 保持运行")
+        return
+    logging.info("结束 podcast_server")
+    server.terminate()
+    server.wait()
+
+
+def main():
+    args = sys.argv[1:]
+    concurrency = parse_concurrency(pop_option(args, "--concurrency"))
+    os.makedirs(episodes_dir, exist_ok=True)
+    os.makedirs(history_dir, exist_ok=True)
+
+    pipeline = Pipeline([
+        Stage('download', download, concurrency['download']),
+        Stage('probe', check_duration, concurrency['probe']),
+        Stage('upload', upload, concurrency['upload']),
+        Stage('transcribe', transcribe, concurrency['transcribe']),
+        Stage('export', export, concurrency['export']),
+    ])
+
+    # 已在其他批次清单中的文件由那次上传负责
+    pending = set(batches.pending_files(episodes_dir))
+    audio_files = [path for path in list_audio(episodes_dir) if os.path.basename(path) in pending]
+    if audio_files:
+        logging.info(f"audio 中存在 {len(audio_files)} 个音频文件，将直接上传至通义: {audio_files}")
+        items, first_stage = audio_files, 1
+    else:
+        items, first_stage = parse_items(args[0] if args else None), 0
+
+    server = start_podcast_server()
+    try:
+        failed = pipeline.run(items, first_stage)
+    finally:
+        stop_podcast_server(server)
+    # 两阶段导出时导读、脑图在思维导图生成后才导出，此时不再需要 podcast 服务
+    deferred_failed = wait_deferred()
+    if failed > 0 or deferred_failed > 0:
+        logging.error(f"导出出错，流水线失败 {failed} 个（各阶段见上方统计），导读、脑图失败 {deferred_failed}")
+        sys.exit(1)
+    logging.info("导出完成")
+
+
+if __name__ == '__main__':
+    atexit.register(http_client.log_stats)
+    atexit.register(downloader.log_stats)
+    atexit.register(metrics.write_textfile)
+    main()
@@ -1,8 +1,22 @@
 from flask import Flask, render_template_string, send_from_directory, make_response, request
 import os
+import gzip
+import hashlib
 import logging
 import mimetypes
-from config import episodes_dir, port, log_level, log_format, log_datefmt
+import threading
+import urllib.parse
+from collections import OrderedDict
+import batches
+import dedupe
+import job_store
+import metrics
+import transcode
+from datetime import datetime, timezone
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from config import episodes_dir, port, log_level, log_format, log_datefmt, server_workers, server_threads, \
+    x_accel_redirect_prefix, episode_cache_max_age, transcode_mode, transcode_cache_dir, dedupe_audio
 
 # 配置日志记录
 logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
@@ -13,7 +27,7 @@ RSS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
 <rss version="2.0">
     <channel>
         <title>Your Podcast Name</title>
-        <link>{{ domain }}podcast</link>
+        <link>{{ link }}</link>
         <description>This is a description of your podcast.</description>
         {% for file in files %}
         <item>
@@ -29,39 +43,193 @@ RSS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
 """
 
 
+AUDIO_TYPES = ['aac', 'm4a', 'wav', 'mp3', 'webm', 'mp4']  # 支持多种音频格式
+
+# 渲染好的 RSS 最多缓存的份数；缓存键含客户端提供的 Host，超过时淘汰最久未访问的
+FEED_CACHE_MAX_ENTRIES = 64
+
+
+class EpisodeIndex:
+    """
+    episodes_dir 的文件索引，目录 mtime 变化（增删、重命名文件）或去重索引有新增时才重新扫描，
+    并按访问域名和批次缓存渲染好的 RSS（含 gzip 版本和 ETag，最多 FEED_CACHE_MAX_ENTRIES 份）
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._dedupe_version = None
+        self._files = []
+        self._last_modified = None
+        self._feeds = OrderedDict()
+
+    def _refresh(self):
+        if not os.path.exists(self.directory):
+            self._dir_mtime, self._files, self._last_modified = None, [], None
+            self._feeds.clear()
+            return
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        # 去重索引有新增时也重新扫描，刚转写的音频随即不再发布
+        dedupe_version = job_store.fingerprints_version() if dedupe_audio else None
+        if dir_mtime == self._dir_mtime and dedupe_version == self._dedupe_version:
+            return
+        files = []
+        skipped = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                filename = entry.name
+                if filename.startswith('.') or not entry.is_file():
+                    continue
+                filetype = os.path.splitext(filename)[1][1:].lower()
+                if filetype in AUDIO_TYPES and dedupe.find(entry.path) is not None:
+                    # 已转写过的音频不再发布
+                    skipped += 1
+                elif filetype in AUDIO_TYPES:
+                    stat = entry.stat()
+                    mime_type, _ = mimetypes.guess_type(filename)  # 获取 MIME 类型
+                    files.append({
+                        'filename': filename,
+                        'title': os.path.splitext(filename)[0],
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime,
+                        'type': mime_type or "audio/mpeg"  # 兜底默认值
+                    })
+        # 按修改时间倒序排序（最新的文件排在最前面）
+        files.sort(key=lambda x: x['mtime'], reverse=True)
+        self._dir_mtime = dir_mtime
+        self._dedupe_version = dedupe_version
+        self._files = files
+        # 去重索引有新增时发布的文件会减少，Last-Modified 也要随之前进，否则只带 If-Modified-Since 的客户端会得到 304
+        dedupe_time = dedupe_version[1] if dedupe_version else None
+        self._last_modified = max([dir_mtime / 1e9, dedupe_time or 0] + [f['mtime'] for f in files])
+        self._feeds.clear()
+        logging.info(f"重新扫描 {self.directory}，共 {len(files)} 个音频文件" +
+                     (f"，{skipped} 个已转写过，不发布" if skipped else ""))
+
+    def feed(self, domain, batch_id=None):
+        """
+        返回 (rss 正文, gzip 正文, etag, last_modified 时间戳, 文件数)，
+        指定 batch_id 时只包含该批次清单中的文件，清单不存在时返回 None
+        """
+        with self._lock:
+            self._refresh()
+            manifest_mtime = None
+            if batch_id is not None:
+                try:
+                    manifest_mtime = os.stat(batches.manifest_path(batch_id)).st_mtime_ns
+                except (ValueError, OSError):
+                    self._drop_batch(batch_id)
+                    return None
+            cache_version = transcode.cache_version() if transcode_mode else None
+            key = (domain, batch_id, manifest_mtime, cache_version)
+            cached = self._feeds.get(key)
+            if cached is None:
+                files = self._files
+                # 转码缓存变化时发布的地址和大小随之变化，同样推进 Last-Modified
+                last_modified = max(self._last_modified or 0, (cache_version or 0) / 1e9) or None
+                if batch_id is not None:
+                    manifest = batches.load(batch_id)
+                    if manifest is None:
+                        self._drop_batch(batch_id)
+                        return None
+                    names = set(manifest['files'])
+                    files = [f for f in files if f['filename'] in names]
+                    last_modified = max([last_modified or 0, manifest_mtime / 1e9] + [f['mtime'] for f in files])
+                    # 清单更新后丢弃该批次的旧缓存（所有域名）
+                    self._drop_batch(batch_id)
+                files = [self._advertise(f, domain) for f in files]
+                link = f"{domain}podcast/{batch_id}/" if batch_id else f"{domain}podcast"
+                body = render_template_string(RSS_TEMPLATE, files=files, link=link).encode('utf-8')
+                etag = hashlib.sha1(body).hexdigest()
+                cached = (body, gzip.compress(body), etag, last_modified, len(files))
+                self._feeds[key] = cached
+                while len(self._feeds) > FEED_CACHE_MAX_ENTRIES:
+                    self._feeds.popitem(last=False)
+            else:
+                self._feeds.move_to_end(key)
+            return cached
+
+    def _drop_batch(self, batch_id):
+        for old_key in [k for k in self._feeds if k[1] == batch_id]:
+            del self._feeds[old_key]
+
+    def _advertise(self, file, domain):
+        """
+        开启转码时只发布已转码完成的文件（/podcast/transcoded/<标题>.opus 或 .aac，大小准确）；
+        尚未转码的文件提交后台转码，完成前发布原文件
+        """
+        original = dict(file, url=f"{domain}podcast/music/{file['filename']}")
+        if not transcode_mode:
+            return original
+        path = os.path.join(self.directory, file['filename'])
+        derived = transcode.lookup(path)
+        if derived is None:
+            transcode.submit(path)
+            return original
+        return dict(file, url=f"{domain}podcast/transcoded/{transcode.derived_name(file['filename'])}",
+                    size=os.path.getsize(derived), type=transcode.mime_type())
+
+    def source(self, title):
+        """按标题（不含扩展名的文件名）查找发布中的原文件名，找不到时返回 None"""
+        with self._lock:
+            self._refresh()
+            return next((f['filename'] for f in self._files if f['title'] == title), None)
+
+
+episode_index = EpisodeIndex(episodes_dir)
+
+
+@app.after_request
+def count_request(response):
+    metrics.SERVER_REQUESTS.inc(endpoint=request.endpoint or 'unknown', code=response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def serve_metrics():
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
 @app.route('/podcast/')
 def podcast_feed():
     real_ip = get_real_ip()
     domain = request.host_url  # 动态获取访问的域名或 IP
     logging.info(f"{real_ip} -> {domain} Generating RSS feed from directory: {episodes_dir}")
-    files = []
-    if os.path.exists(episodes_dir):
-        file_list = sorted(os.listdir(episodes_dir), key=lambda f: os.path.getmtime(os.path.join(episodes_dir, f)), reverse=True)
-        for filename in file_list:
-            if filename.startswith('.'):
-                continue
-            filetype = filename.split(".")[1]
-            if filetype in ['aac', 'm4a', 'wav', 'mp3', 'webm', 'mp4']:  # 支持多种音频格式
-                filepath = os.path.join(episodes_dir, filename)
-                file_url = f"{domain}podcast/music/{filename}"
-                file_size = os.path.getsize(filepath)
-                mime_type, _ = mimetypes.guess_type(filepath)  # 获取 MIME 类型
-                if not mime_type:
-                    mime_type = "audio/mpeg"  # 兜底默认值
-                files.append({
-                    'title': os.path.splitext(filename)[0],
-                    'url': file_url,
-                    'size': file_size,
-                    'mtime': os.path.getmtime(filepath),
-                    'type': mime_type  # 添加 type 字段
-                })
+    return feed_response(episode_index.feed(domain))
+
+
+@app.route('/podcast/<batch_id>/')
+def podcast_batch_feed(batch_id):
+    real_ip = get_real_ip()
+    domain = request.host_url  # 动态获取访问的域名或 IP
+    logging.info(f"{real_ip} -> {domain} Generating RSS feed for batch: {batch_id}")
+    feed = episode_index.feed(domain, batch_id) if batches.is_valid_id(batch_id) else None
+    if feed is None:
+        logging.error(f"Batch not found: {batch_id}")
+        return "Batch not found", 404
+    return feed_response(feed)
 
-        # 按修改时间倒序排序（最新的文件排在最前面）
-        files.sort(key=lambda x: x['mtime'], reverse=True)
 
-    response = make_response(render_template_string(RSS_TEMPLATE, files=files, domain=domain))
+def feed_response(feed):
+    body, gzip_body, etag, last_modified, file_count = feed
+    response = make_response()
     response.headers['Content-Type'] = 'application/rss+xml; charset=utf-8'
-    logging.debug(f"Generated RSS feed with {len(files)} items")
+    response.headers['Vary'] = 'Accept-Encoding'
+    if last_modified is not None:
+        response.last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+    if 'gzip' in request.accept_encodings:
+        response.set_data(gzip_body)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag + '-gzip')
+    else:
+        response.set_data(body)
+        response.set_etag(etag)
+    # 客户端带 If-None-Match / If-Modified-Since 且未变化时返回 304
+    response.make_conditional(request)
+    logging.debug(f"Generated RSS feed with {file_count} items, status {response.status_code}")
     return response
 
 
@@ -80,16 +248,77 @@ def serve_episodes(filename):
     real_ip = get_real_ip()
     domain = request.host_url  # 动态获取访问的域名或 IP
     logging.debug(f"{real_ip} -> {domain} Attempting to serve file: {episodes_dir}{filename}")
-    if not os.path.exists(os.path.join(episodes_dir, filename)):
+
+    try:
+        if x_accel_redirect_prefix:
+            # 由前置 nginx 通过 X-Accel-Redirect 发送文件内容（internal location 指向 episodes_dir）
+            filepath = safe_join(episodes_dir, filename)
+            if filepath is None or not os.path.isfile(filepath):
+                raise NotFound()
+            response = make_response()
+            response.headers['X-Accel-Redirect'] = x_accel_redirect_prefix + urllib.parse.quote(filename)
+            response.headers['Content-Type'] = mimetypes.guess_type(filename)[0] or "audio/mpeg"
+            response.headers['Cache-Control'] = f"public, max-age={episode_cache_max_age}"
+            return response
+        # send_from_directory 支持 Range / 206 / If-Range，在 gunicorn 下通过 wsgi.file_wrapper 使用 sendfile 发送
+        return send_from_directory(episodes_dir, filename, max_age=episode_cache_max_age)
+    except NotFound:
         logging.error(f"File not found: {filename}")
         return "File not found", 404
-    
-    try:
-        return send_from_directory(episodes_dir, filename)
     except Exception as e:
         logging.error(f"Error serving file {filename}: {str(e)}")
         return "Internal Server Error", 500
 
 
+@app.route('/podcast/transcoded/<path:filename>')
+def serve_transcoded(filename):
+    # 地址为 <标题>.opus / .aac，对应 episodes_dir 中同名的原文件
+    title = os.path.splitext(filename)[0]
+    source = episode_index.source(title) if transcode_mode and transcode.derived_name(filename) == filename else None
+    if source is None:
+        logging.error(f"File not found: {filename}")
+        return "File not found", 404
+    filepath = os.path.join(episodes_dir, source)
+    derived = transcode.lookup(filepath)
+    if derived is None:
+        # 转码尚未完成（如客户端使用的是旧的 feed），等待转码完成；同一文件同时只转码一次
+        logging.info(f"Waiting for transcode: {source}")
+        future = transcode.submit(filepath)
+        derived = future.result() if future is not None else None
+        if derived is None:
+            return serve_episodes(source)
+    transcode.touch(derived)
+    # send_from_directory 带准确的 Content-Length，并支持 Range
+    return send_from_directory(transcode_cache_dir, os.path.basename(derived), mimetype=transcode.mime_type(),
+                               max_age=episode_cache_max_age)
+
+
+def run_server(workers=server_workers, threads=server_threads):
+    """workers > 1 时使用 gunicorn 多进程（gthread）服务，否则使用 Flask 自带的多线程服务"""
+    if workers > 1:
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            logging.warning("未安装 gunicorn，使用 Flask 自带服务（pip install gunicorn 以启用多进程服务）")
+        else:
+            class GunicornServer(BaseApplication):
+                def load_config(self):
+                    self.cfg.set('bind', f"0.0.0.0:{port}")
+                    self.cfg.set('workers', workers)
+                    self.cfg.set('worker_class', 'gthread')
+                    self.cfg.set('threads', threads)
+                    # 慢速客户端下载数小时音频时不应被判定为超时
+                    self.cfg.set('timeout', 0)
+                    self.cfg.set('sendfile', True)
+
+                def load(self):
+                    return app
+
+            logging.info(f"使用 gunicorn 启动 podcast 服务，workers: {workers}, threads: {threads}")
+            GunicornServer().run()
+            return
+    app.run(host='0.0.0.0', port=port, threaded=True)
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    run_server()
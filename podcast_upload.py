@@ -1,12 +1,25 @@
 import sys
-import time
-import requests
+import atexit
+import http_client
+import job_store
+import metrics
+import catalog
+import batches
+import dedupe
+import transcode
 import logging
 import os
 import json
 import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm  # 导入tqdm
-from config import episodes_dir, podcast_url, log_level, log_format, log_datefmt, headers
+from acquire import probe_durations
+from poll_scheduler import PollScheduler, PollError, PENDING, DONE, FAILED, transcription_eta, transcription_timeout, \
+    record_duration, sweep_records
+from config import episodes_dir, history_dir, transcode_mode, yt_list_info, log_level, log_format, log_datefmt, headers, \
+    tongyi_efficiency_host, tongyi_assistant_host, submit_chunk_size, submit_concurrency
 
 
 # 设置兼容 tqdm 的 logging
@@ -20,14 +33,15 @@ logging.basicConfig(level=log_level, handlers=[TqdmLoggingHandler()], format=log
 
 
 # 请求1：提交podcast地址
+@metrics.track_api
 def request_1(podcast_url):
-    url = "https://tw-efficiency.biz.aliyun.com/api/trans/parseNetSourceUrl?c=tongyi-web"
+    url = f"{tongyi_efficiency_host}/api/trans/parseNetSourceUrl?c=tongyi-web"
     payload = {
         "action": "parseNetSourceUrl",
         "version": "1.0",
         "url": podcast_url
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload)
     if response.status_code == 200:
         data = response.json()
         logging.debug(f"Request 1 response: {data}")
@@ -42,14 +56,15 @@ def request_1(podcast_url):
 
 
 # 请求2：查询podcast音频列表
+@metrics.track_api
 def request_2(task_id):
-    url = "https://tw-efficiency.biz.aliyun.com/api/trans/queryNetSourceParse?c=tongyi-web"
+    url = f"{tongyi_efficiency_host}/api/trans/queryNetSourceParse?c=tongyi-web"
     payload = {
         "action": "queryNetSourceParse",
         "version": "1.0",
         "taskId": task_id
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload, idempotent=True)
     if response.status_code == 200:
         data = response.json()
         logging.debug(f"Request 2 response: {data}")
@@ -65,17 +80,19 @@ def request_2(task_id):
 
 
 # 请求3：提交podcast音频解析任务
-def request_3(file_id, file_size, show_name):
-    url = "https://qianwen.biz.aliyun.com/assistant/api/record/blog/start?c=tongyi-web"
+@metrics.track_api
+def request_3(url_items):
+    """一次提交多个音频（接口的 files 为列表），返回完整的 recordIdList（接口不保证与 url_items 顺序一致）"""
+    url = f"{tongyi_assistant_host}/assistant/api/record/blog/start?c=tongyi-web"
     payload = {
         "dirIdStr": "",
         "files": [{
-            "fileId": file_id,
+            "fileId": url_item.get('fileId'),
             "dirId": 0,
-            "fileSize": file_size,
+            "fileSize": url_item.get('size'),
             "tag": {
                 "fileType": "net_source",
-                "showName": show_name,
+                "showName": url_item.get('showName', 'unknown'),
                 "lang": "cn",
                 "roleSplitNum": -1,
                 "translateSwitch": 0,
@@ -83,16 +100,16 @@ def request_3(file_id, file_size, show_name):
                 "client": "web",
                 "originalTag": ""
             }
-        }],
+        } for url_item in url_items],
         "taskType": "net_source",
         "bizTerminal": "web"
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload)
     if response.status_code == 200:
         data = response.json()
         logging.debug(f"Request 3 response: {data}")
         if data.get('success', False) and data.get('data') and data['data'].get('recordIdList'):
-            return data['data']['recordIdList'][0]
+            return data['data']['recordIdList']
         else:
             logging.warning("Request 3 failed or missing data: " + data.get('errorMsg', json.dumps(data)))
             return None
@@ -102,18 +119,19 @@ def request_3(file_id, file_size, show_name):
 
 
 # 请求4：查询音频解析状态
-def request_4(page_size=1):
-    url = "https://qianwen.biz.aliyun.com/assistant/api/record/list/poll?c=tongyi-web"
+@metrics.track_api
+def request_4(page_size=1, page_no=1):
+    url = f"{tongyi_assistant_host}/assistant/api/record/list/poll?c=tongyi-web"
     payload = {
         "status": [10, 20, 30, 40, 41],
         "recordSources": ["chat", "zhiwen", "tingwu"],
         "taskTypes": ["local", "net_source", "doc_read", "url_read", "paper_read", "book_read", "doc_convert"],
         "terminal": "web",
         "module": "uploadhistory",
-        "pageNo": 1,
+        "pageNo": page_no,
         "pageSize": page_size
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, headers=headers, json=payload, idempotent=True)
     if response.status_code == 200:
         data = response.json()
         logging.debug(f"Request 4 response: {data}")
@@ -127,159 +145,320 @@ def request_4(page_size=1):
         return None
 
 
+def sweep_net_source_parse(task_ids):
+    results = {}
+    for task_id in task_ids:
+        task_status_data = request_2(task_id)
+        if task_status_data is None:
+            logging.info("step 2: 解析音频列表未就绪，稍后重试")
+            continue
+        status = task_status_data.get('status')
+        if status == 0:
+            results[task_id] = (DONE, task_status_data)
+        elif status is not None and status > 0:
+            results[task_id] = (FAILED, task_status_data)
+        else:
+            results[task_id] = (PENDING, status)
+    return results
+
+
+def poll_record_page(page_no, page_size):
+    """list/poll 的一页记录，查询失败时返回 None"""
+    record_data = request_4(page_size, page_no)
+    if record_data is None or not record_data.get('batchRecord'):
+        if page_no == 1:
+            logging.info(f"step 4: 获取音频解析状态失败，稍后重新检测")
+        return None
+    return [record_task for record in record_data['batchRecord'] for record_task in record.get('recordList') or []]
+
+
+def sweep_transcription(record_ids):
+    results = {}
+    for record_id, record_task in sweep_records(poll_record_page, record_ids):
+        record_status = record_task.get('recordStatus')
+        confirm_audio(record_task.get('recordTitle'), record_id)
+        job_store.advance_record(record_id, 'transcribed' if record_status == 30 else None,
+                                 title=record_task.get('recordTitle'), status=record_status)
+        if record_status == 30:
+            results[record_id] = (DONE, record_task)
+        elif record_status == 40:
+            results[record_id] = (FAILED, record_task)
+        else:
+            logging.debug(f"step 4: 音频解析任务未完成 {record_task.get('recordTitle')}, code: {record_status}")
+            results[record_id] = (PENDING, record_status)
+    return results
+
+
+def record_titles(record_ids):
+    """返回转写列表中 record_ids 的 {record_id: recordTitle}，列表中找不到的记录不返回"""
+    return {record_id: record_task.get('recordTitle')
+            for record_id, record_task in sweep_records(poll_record_page, record_ids)}
+
+
+def confirm_audio(show_name, record_id):
+    """提交时未能确认 Record ID 的音频，转写列表中出现同名记录后再记下对应关系"""
+    audio = job_store.get_audio(show_name) if show_name else None
+    if audio is None or audio['record_id']:
+        return
+    job_store.update_audio(show_name, record_id=record_id)
+    job_store.advance_record(record_id, 'submitted', title=show_name)
+    logging.info(f"step 4: 已确认 {show_name} 的 Record ID: {record_id}")
+    remember_audio(show_name, record_id)
+
+
+scheduler = PollScheduler()
+scheduler.register('net_source_parse', sweep_net_source_parse)
+scheduler.register('transcription', sweep_transcription)
+
+
+def parse_podcast(podcast_url):
+    """step 1 - 2：提交 podcast 地址并等待解析音频列表，返回 (task_id, 音频列表)，失败返回 None"""
+    # 请求1：提交podcast地址
+    logging.info(f"step 1: 准备提交 podcast 地址: {podcast_url}")
+    task_id = request_1(podcast_url)
+    if task_id is None:
+        logging.error("step 1 error: 提交 podcast 地址失败")
+        return None
+    logging.info(f"step 1 success: 已提交 podcast 地址，Task ID: {task_id}")
+
+    # 请求2：查询podcast音频列表
+    logging.info("step 2: 准备解析音频列表")
+    try:
+        task_status_data = scheduler.wait('net_source_parse', task_id, timeout=120,
+                                          desc="等待解析音频列表", done_desc="解析音频列表已就绪")
+    except PollError as e:
+        logging.error(f"step 2: 解析音频列表失败，status: {e.value.get('status')}, type: {e.value.get('type', 'unknown')}")
+        logging.warning(f"请先确认 {podcast_url} 可以正常访问（可在 链接速读->播客链接转写 中进行测试）")
+        return None
+    except TimeoutError:
+        logging.error("step 2 error: 解析音频列表超时或失败")
+        return None
+    logging.info("step 2 success: 解析音频列表已就绪")
+    return task_id, task_status_data.get('urls', [])
+
+
+def submit_transcriptions(task_id, urls_to_process, chunk_size=submit_chunk_size, concurrency=submit_concurrency):
+    """
+    step 3：提交音频解析任务（已提交过的文件跳过），返回 record_id 列表；
+    每个请求提交 chunk_size 个音频，多个请求并发发送（速率由 rate_limiter 控制）
+    """
+    logging.info(f"step 3: 准备提交 {len(urls_to_process)} 个音频解析任务")
+
+    record_ids = []
+    new_items = []
+    for url_item in urls_to_process:
+        show_name = url_item.get('showName', 'unknown')  # Default name
+        record_id = job_store.submitted_record_id(show_name)
+        if record_id is not None:
+            logging.info(f"step 3: {show_name} 此前已提交，跳过 Record ID: {record_id}")
+            record_ids.append(record_id)
+        else:
+            new_items.append(url_item)
+
+    chunks = [new_items[i:i + max(1, chunk_size)] for i in range(0, len(new_items), max(1, chunk_size))]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="submit") as executor, \
+            tqdm(total=len(new_items), desc="提交音频解析任务", unit="个") as progress:
+        futures = {executor.submit(request_3, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                chunk_ids = future.result() or []
+            except Exception as e:
+                logging.error(f"step 3 error: 提交 {len(chunk)} 个音频出错: {e}")
+                chunk_ids = []
+            record_ids.extend(chunk_ids)
+            if chunk_ids and len(chunk_ids) != len(chunk):
+                logging.warning(f"step 3: 提交 {len(chunk)} 个音频，返回 {len(chunk_ids)} 个 Record ID，"
+                                f"无法对应的记录请到网页查看: {chunk_ids}")
+            # 接口不保证 recordIdList 的顺序，多个音频时按转写列表中的标题对应，未能确认的不记录，等转写状态查询时再确认
+            matched = {}
+            if len(chunk) == 1 and len(chunk_ids) == 1:
+                matched[chunk[0].get('showName', 'unknown')] = chunk_ids[0]
+            elif chunk_ids:
+                for record_id, title in record_titles(chunk_ids).items():
+                    matched.setdefault(title, record_id)
+            for url_item in chunk:
+                show_name = url_item.get('showName', 'unknown')
+                record_id = matched.get(show_name)
+                job_store.update_audio(show_name, task_id=task_id, file_id=url_item.get('fileId'), record_id=record_id)
+                if record_id is None:
+                    logging.warning(f"step 3: {show_name} 提交完成，但未能确认 Record ID，将在查询转写状态时确认"
+                                    if chunk_ids else f"step 3: {show_name} 提交完成，但获取 Record ID 失败，请到网页查看进度")
+                else:
+                    job_store.advance_record(record_id, 'submitted', title=show_name)
+                    logging.info(f"step 3 success: 提交完成 {show_name} Record ID: {record_id}")
+                    remember_audio(show_name, record_id)
+            progress.update(len(chunk))
+    logging.info(f"step 3 success: 提交音频解析任务完成")
+    return record_ids
+
+
+def remember_audio(show_name, record_id):
+    """把已提交的音频加入去重索引，之后改名、复制回 audio/ 的相同文件不再提交"""
+    audio = job_store.get_audio(show_name)
+    if audio is None or not audio['audio_file'] or not os.path.isfile(audio['audio_file']):
+        return
+    try:
+        dedupe.remember(audio['audio_file'], record_id)
+    except OSError as e:
+        logging.warning(f"step 3: {show_name} 加入去重索引失败: {e}")
+
+
+def skip_transcribed(directory, files):
+    """去掉内容与已转写音频相同的文件，对应的 record_id 记到该文件名下，返回其余文件"""
+    remaining = []
+    for filename in files:
+        known = dedupe.find(os.path.join(directory, filename))
+        if known is None:
+            remaining.append(filename)
+            continue
+        show_name = os.path.splitext(filename)[0]
+        logging.info(f"{filename} 与已转写的 {known['show_name']} 相同，跳过 Record ID: {known['record_id']}")
+        job_store.update_audio(show_name, record_id=known['record_id'])
+    return remaining
+
+
+def wait_transcriptions(record_ids, timeout=None):
+    """
+    step 4：等待转写完成，全部完成返回 True，超时返回 False，有任务失败返回 None；
+    timeout 为 None 时按音频时长为每条记录计算超时（见 poll_scheduler.transcription_timeout）
+    """
+    all_task_done = True
+    all_count = len(record_ids)
+    # 此前已确认转写完成的记录不再查询
+    pending_ids = [record_id for record_id in record_ids
+                   if not job_store.reached(job_store.get_record(record_id), 'transcribed')]
+    done_count = all_count - len(pending_ids)
+    start = time.monotonic()
+    futures = {scheduler.submit('transcription', record_id, timeout=timeout or transcription_timeout(record_id),
+                                eta=transcription_eta(record_id)): record_id
+               for record_id in pending_ids}
+    with tqdm(total=all_count, initial=done_count, desc=f"检测音频解析状态 {done_count} / {all_count}") as progress:
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except PollError as e:
+                record_task = e.value
+                msg = f" {record_task.get('recordTitle')}, code: {record_task.get('recordStatus')}, " \
+                      f"errorCode: {record_task.get('oriErrorCode')}, " \
+                      f"msg: {record_task.get('oriErrorMsg')}"
+                logging.error(f"step 4 error: 音频解析任务失败，请到网页查看详情: {msg}")
+                progress.set_description(f"音频解析任务失败")
+                return None
+            except TimeoutError:
+                all_task_done = False
+                continue
+            observe_transcription(futures[future], time.monotonic() - start)
+            done_count += 1
+            progress.update(1)
+            progress.set_description(f"检测音频解析状态 {done_count} / {all_count}")
+    return all_task_done
+
+
+def observe_transcription(record_id, seconds):
+    """记录每小时音频的转写用时，之后的转写等待据此估算完成时间"""
+    duration = record_duration(record_id)
+    if duration:
+        metrics.TRANSCRIPTION_SECONDS_PER_AUDIO_HOUR.observe(seconds / (duration / 3600))
+
+
 # 执行流程：顺序调用请求
 def process_podcast(podcast_url):
     try:
-        # 请求1：提交podcast地址
-        logging.info(f"step 1: 准备提交 podcast 地址: {podcast_url}")
-        time.sleep(2)
-        task_id = request_1(podcast_url)
-        if task_id is None:
-            logging.error("step 1 error: 提交 podcast 地址失败")
+        parsed = parse_podcast(podcast_url)
+        if parsed is None:
             sys.exit(1)  # 失败退出
-        logging.info(f"step 1 success: 已提交 podcast 地址，Task ID: {task_id}")
-
-        # 请求2：查询podcast音频列表
-        task_status_data = None
-        logging.info("step 2: 准备解析音频列表")
-        time.sleep(2)
-        with tqdm(range(30), desc="等待解析音频列表") as progress:
-            for _ in progress:
-                task_status_data = request_2(task_id)
-                if task_status_data is None:
-                    logging.info("step 2: 解析音频列表未就绪，稍后重试")
-                    time.sleep(2)
-                    continue
-                status = task_status_data.get('status')
-                if status == 0:
-                    progress.n = progress.total
-                    progress.set_description(f"解析音频列表已就绪")
-                    progress.close()
-                    break
-                elif status > 0:
-                    error_type = task_status_data.get('type', 'unknown')
-                    logging.error(f"step 2: 解析音频列表失败，status: {status}, type: {error_type}")
-                    logging.warning(f"请先确认 {podcast_url} 可以正常访问（可在 链接速读->播客链接转写 中进行测试）")
-                    progress.set_description(f"解析音频列表超时")
-                    progress.close()
-                    sys.exit(1)
-                time.sleep(2)
-
-        if task_status_data is None or task_status_data.get('status') != 0:
-            logging.error("step 2 error: 解析音频列表超时或失败")
-            sys.exit(1)
-        logging.info("step 2 success: 解析音频列表已就绪")
+        task_id, urls_to_process = parsed
 
         # 请求3：提交音频解析任务
-        urls_to_process = task_status_data.get('urls', [])
         count = len(urls_to_process)
         if count == 0:
             logging.error(f"step 3 error: 提交音频解析任务失败，未解析到音频。")
             sys.exit(1)
-
-        logging.info(f"step 3: 准备提交 {count} 个音频解析任务")
-
-        for url_item in tqdm(urls_to_process, desc="提交音频解析任务", unit="个"):
-            file_id = url_item.get('fileId')
-            file_size = url_item.get('size')
-            show_name = url_item.get('showName', 'unknown')  # Default name
-            time.sleep(2)
-            record_id = request_3(file_id, file_size, show_name)
-            if record_id is None:
-                logging.warning(f"step 3: {show_name} 提交完成，但获取 Record ID 失败，请到网页查看进度")
-            else:
-                logging.info(f"step 3 success: 提交完成 {show_name} Record ID: {record_id}")
-        logging.info(f"step 3 success: 提交音频解析任务完成")
+        record_ids = submit_transcriptions(task_id, urls_to_process)
 
         # 请求4：查询音频解析状态
         logging.info(f"step 4: 查询音频解析状态")
-        time.sleep(2)
-        all_task_done = False
-        with tqdm(range(100), desc=f"检测音频解析状态") as progress:
-            for _ in progress:
-                record_data = request_4(page_size=count)
-                if record_data is None or not record_data.get('batchRecord'):
-                    logging.info(f"step 4: 获取音频解析状态失败，稍后重新检测")
-                    time.sleep(20)
-                    continue
-                batch_record = record_data.get('batchRecord')
-                all_count = len(batch_record)
-                done_count = 0
-                for record in batch_record:
-                    record_task = record.get('recordList')[0]
-                    record_status = record_task.get('recordStatus')
-                    if record_status == 40:
-                        msg = f" {record_task.get('recordTitle')}, code: {record_status}, " \
-                              f"errorCode: {record_task.get('oriErrorCode')}, " \
-                              f"msg: {record_task.get('oriErrorMsg')}"
-                        logging.error(f"step 4 error: 音频解析任务失败，请到网页查看详情: {msg}")
-                        progress.set_description(f"音频解析任务失败")
-                        progress.close()
-                        sys.exit(1)
-                    elif record_status == 30:
-                        done_count += 1
-                    else:
-                        logging.debug(
-                            f"step 4: 音频解析任务未完成 {record_task.get('recordTitle')}, code: {record_status}")
-                progress.set_description(f"检测音频解析状态 {done_count + 1} / {all_count}")
-                if done_count == all_count:
-                    all_task_done = True
-                    progress.set_description(f"音频解析任务完成 {done_count} / {all_count}")
-                    progress.n = progress.total
-                    progress.close()
-                    break
-                time.sleep(20)
-
-            if not all_task_done:
-                logging.warning(f"step 4: 音频解析任务超时未完成")
-            else:
-                logging.info(f"step 4 success: 音频解析任务完成")
+        if len(record_ids) < count:
+            logging.warning(f"step 4: {count - len(record_ids)} 个任务未获取到 Record ID，请到网页查看进度")
+        all_task_done = wait_transcriptions(record_ids)
+        if all_task_done is None:
+            sys.exit(1)
+        elif not all_task_done:
+            logging.warning(f"step 4: 音频解析任务超时未完成")
+        else:
+            logging.info(f"step 4 success: 音频解析任务完成")
         return count
     except Exception as e:
         logging.error(f"提交音频解析任务出错: {e}")
         sys.exit(1)
 
 
-def check_date(episodes_dir: str, json_path: str = 'yt_list_info.json'):
-    if not os.path.exists(json_path):
-        logging.debug(f"未找到 JSON 文件：{json_path}，跳过日期检查")
-        return
-
-    # 加载 JSON 数据
-    with open(json_path, 'r', encoding='utf-8') as f:
-        try:
-            yt_info_list = json.load(f)
-        except json.JSONDecodeError:
-            logging.debug(f"JSON 文件格式不正确：{json_path}")
-            return
-
-    # 构建 ID 到 liveDate 的映射
-    id_to_date = {item["id"]: item["liveDate"] for item in yt_info_list if "id" in item and "liveDate" in item}
-
-    # 遍历 episodes_dir 中的文件
-    for filename in tqdm(os.listdir(episodes_dir), desc="文件名日期检测", unit="个"):
-        match = re.match(r'^(\d{4}-\d{2}-\d{2})_([a-zA-Z0-9_-]{11})', filename)
-        if not match:
-            continue  # 跳过不符合命名规则的文件
+def process_batch(directory: str = episodes_dir):
+    """
+    为 directory 中尚未发布的音频创建批次，用该批次独立的 feed 地址提交转写，结束后删除清单，
+    并把本次处理的音频（含已转写过而跳过的）移动到 history_dir；其他批次的文件不受影响
+    """
+    files = batches.pending_files(directory)
+    batch_id = batches.create(skip_transcribed(directory, files))
+    if batch_id is None:
+        logging.info(f"{directory} 中没有需要上传的音频")
+        archive(directory, files)
+        return 0
+    try:
+        paths = [os.path.join(directory, name) for name in batches.load(batch_id)['files']]
+        # 检测时长（缓存在状态库），用于估算转写用时和等待的超时
+        probe_durations(paths)
+        if transcode_mode == 'background':
+            # 先转码完成，通义拉取的是转码后的小文件
+            transcode.prepare(paths)
+        count = process_podcast(batches.feed_url(batch_id))
+    finally:
+        batches.remove(batch_id)
+    archive(directory, files)
+    return count
+
+
+def archive(directory, files):
+    """提交完成的音频不再需要发布，移动到 history_dir"""
+    os.makedirs(history_dir, exist_ok=True)
+    moved = 0
+    for filename in files:
+        path = os.path.join(directory, filename)
+        if not os.path.isfile(path):
+            continue
+        target = os.path.join(history_dir, filename)
+        shutil.move(path, target)
+        job_store.add_audio(target)
+        moved += 1
+    if moved:
+        logging.info(f"已移动 {moved} 个音频到 {history_dir}")
 
-        file_date_str, video_id = match.groups()
-        expected_date = id_to_date.get(video_id)
 
-        if not expected_date:
-            logging.info(f"找不到 ID {video_id} 的直播日期，跳过检测：{filename}")
+def register_audio(episodes_dir: str):
+    """把 episodes_dir 中的音频登记到状态库，便于之后按文件名关联 taskId / recordId"""
+    if not os.path.exists(episodes_dir):
+        return
+    for filename in os.listdir(episodes_dir):
+        if filename.startswith('.'):
             continue
+        match = re.match(catalog.VIDEO_FILE_PATTERN, filename)
+        job_store.add_audio(os.path.join(episodes_dir, filename), match.group(2) if match else None)
 
-        if file_date_str != expected_date:
-            # 构建新文件名
-            new_filename = filename.replace(file_date_str, expected_date, 1)
-            old_path = os.path.join(episodes_dir, filename)
-            new_path = os.path.join(episodes_dir, new_filename)
 
-            # 重命名文件
-            os.rename(old_path, new_path)
-            logging.info(f"文件日期与开播日期不一致，已重命名：{filename} -> {new_filename}")
+def check_date(episodes_dir: str, json_path: str = yt_list_info):
+    # JSON 有变化时增量导入目录，未变化时不解析
+    if catalog.sync(json_path) is None:
+        return
+
+    # 遍历 episodes_dir 中的文件，每个文件只做一次索引查询
+    for filename in tqdm(os.listdir(episodes_dir), desc="文件名日期检测", unit="个"):
+        catalog.correct_date(episodes_dir, filename)
 
 
 if __name__ == '__main__':
+    atexit.register(http_client.log_stats)
+    atexit.register(metrics.write_textfile)
     check_date(episodes_dir)
-    process_podcast(podcast_url)
+    register_audio(episodes_dir)
+    process_batch(episodes_dir)
@@ -0,0 +1,212 @@
+import time
+import random
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from tqdm import tqdm
+import job_store
+import metrics
+from config import poll_intervals, poll_backoff, poll_jitter, transcription_seconds_per_audio_hour, \
+    transcription_timeout_seconds, transcription_sweep_page_size, transcription_sweep_max_pages
+
+# 统一的轮询调度器：所有记录的等待（转写、思维导图、导出任务……）都登记在这里，
+# 每个 tick 对同一类等待只调用一次 sweep（能批量的接口一次查询全部记录），
+# 未变化时按 poll_backoff 逐步拉长间隔，状态有变化或接近预计完成时间时回到最短间隔。
+# 每类等待的 sweep 在各自的线程中执行，一类查询很慢（如逐条查询的思维导图）不会拖住其他类；
+# 等待到期后至少再查询一次仍未完成才判定超时
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class PollError(Exception):
+    def __init__(self, message, value=None):
+        super().__init__(message)
+        self.value = value
+
+
+def sweep_records(fetch_page, record_ids, page_size=transcription_sweep_page_size,
+                  max_pages=transcription_sweep_max_pages):
+    """
+    按页查询最新的转写列表，直到覆盖 record_ids 中的所有记录或到达最后一页，逐条返回 (record_id, record_task)；
+    fetch_page(page_no, page_size) 返回该页的记录列表，查询失败时返回 None
+    """
+    wanted = set(record_ids)
+    found = set()
+    for page_no in range(1, max_pages + 1):
+        record_tasks = fetch_page(page_no, page_size)
+        for record_task in record_tasks or []:
+            record_id = next((i for i in (record_task.get('genRecordId'), record_task.get('recordId')) if i in wanted), None)
+            if record_id is not None:
+                found.add(record_id)
+                yield record_id, record_task
+        if not record_tasks or found == wanted or len(record_tasks) < page_size:
+            return
+
+
+def record_duration(record_id):
+    """转写记录对应音频的时长（秒，probes 缓存），找不到音频文件或未检测过时长时返回 None"""
+    audio = job_store.get_audio_by_record(record_id)
+    if audio is None or not audio['audio_file'] or not os.path.isfile(audio['audio_file']):
+        return None
+    stat = os.stat(audio['audio_file'])
+    return job_store.get_probe(os.path.basename(audio['audio_file']), stat.st_size, stat.st_mtime_ns)
+
+
+def transcription_eta(record_id):
+    """
+    按音频时长和每小时音频的转写用时估算剩余秒数，作为转写等待的 eta；
+    音频时长未知时返回 None
+    """
+    duration = record_duration(record_id)
+    if duration is None:
+        return None
+    audio = job_store.get_audio_by_record(record_id)
+    rate = metrics.TRANSCRIPTION_SECONDS_PER_AUDIO_HOUR.mean() or transcription_seconds_per_audio_hour
+    # audio 的 updated_at 为提交（写入 record_id）的时间
+    elapsed = time.time() - (audio['updated_at'] or time.time())
+    return max(1.0, duration / 3600 * rate - elapsed)
+
+
+def transcription_timeout(record_id, minimum=transcription_timeout_seconds):
+    """转写等待的超时：估算剩余用时的 2 倍，不少于 minimum"""
+    eta = transcription_eta(record_id)
+    return max(minimum, 2 * eta) if eta else minimum
+
+
+class _Wait:
+    def __init__(self, kind, key, timeout, eta, desc, done_desc):
+        now = time.monotonic()
+        self.kind = kind
+        self.key = key
+        self.future = Future()
+        self.deadline = now + timeout
+        self.eta = now + eta if eta else None
+        self.interval = poll_intervals[kind][0]
+        self.next_poll = now
+        self.last_value = None
+        self.polls = 0
+        self.start = now
+        self.done_desc = done_desc
+        self.progress = tqdm(total=int(timeout), desc=desc, unit="s") if desc else None
+
+    def finish(self, desc=None):
+        if self.progress is not None:
+            if desc:
+                self.progress.n = self.progress.total
+                self.progress.set_description(desc)
+            self.progress.close()
+
+
+class PollScheduler:
+    def __init__(self):
+        self._sweeps = {}
+        self._waits = {}
+        self._busy = set()  # 正在执行 sweep 的等待类型
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register(self, kind, sweep):
+        """
+        注册一类等待，sweep(keys) 一次查询多个 key 的状态，
+        返回 {key: (DONE | FAILED | PENDING, value)}，未返回的 key 视为 PENDING
+        """
+        self._sweeps[kind] = sweep
+
+    def submit(self, kind, key, timeout, eta=None, desc=None, done_desc=None):
+        """登记一个等待，返回 Future：完成时为 sweep 返回的 value，失败抛 PollError，超时抛 TimeoutError"""
+        with self._cond:
+            wait = self._waits.get((kind, key))
+            if wait is None:
+                wait = _Wait(kind, key, timeout, eta, desc, done_desc)
+                self._waits[(kind, key)] = wait
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="poll-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return wait.future
+
+    def wait(self, kind, key, timeout, eta=None, desc=None, done_desc=None):
+        return self.submit(kind, key, timeout, eta, desc, done_desc).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                idle = [w for w in self._waits.values() if w.kind not in self._busy]
+                if not idle:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                # 超过 deadline 的等待立即再查询一次，查询后仍未完成才超时（见 _tick）
+                next_due = min(min(w.next_poll, w.deadline) for w in idle)
+                if next_due > now:
+                    self._cond.wait(next_due - now)
+                    continue
+                due = {}
+                for wait in idle:
+                    if min(wait.next_poll, wait.deadline) <= now:
+                        due.setdefault(wait.kind, []).append(wait)
+                self._busy.update(due)
+            for kind, waits in due.items():
+                threading.Thread(target=self._tick, args=(kind, waits), name=f"poll-{kind}", daemon=True).start()
+
+    def _tick(self, kind, waits):
+        keys = [wait.key for wait in waits]
+        started = time.monotonic()
+        metrics.POLL_SWEEPS.inc(kind=kind)
+        try:
+            results = self._sweeps[kind](keys) or {}
+        except Exception as e:
+            logging.warning(f"轮询 {kind} 出错，稍后重试: {e}")
+            results = {}
+        now = time.monotonic()
+        with self._cond:
+            self._busy.discard(kind)
+            for wait in waits:
+                state, value = results.get(wait.key, (PENDING, None))
+                wait.polls += 1
+                if wait.progress is not None:
+                    wait.progress.n = min(wait.progress.total, int(now - wait.start))
+                    wait.progress.set_postfix_str(f"已查询 {wait.polls} 次", refresh=True)
+                if state == DONE:
+                    self._remove(wait, 'done')
+                    wait.finish(wait.done_desc)
+                    wait.future.set_result(value)
+                elif state == FAILED:
+                    self._remove(wait, 'failed')
+                    wait.finish()
+                    wait.future.set_exception(PollError(f"{kind} {wait.key} 失败", value))
+                elif started >= wait.deadline:
+                    self._remove(wait, 'timeout')
+                    wait.finish()
+                    wait.future.set_exception(TimeoutError(f"{kind} {wait.key} 等待超时"))
+                else:
+                    changed = value is not None and wait.last_value is not None and value != wait.last_value
+                    wait.last_value = value
+                    wait.next_poll = now + self._next_interval(wait, changed, now)
+            self._cond.notify()
+
+    def _remove(self, wait, result):
+        self._waits.pop((wait.kind, wait.key), None)
+        metrics.POLL_ITERATIONS.observe(wait.polls, kind=wait.kind, result=result)
+        metrics.POLL_WAIT_SECONDS.observe(time.monotonic() - wait.start, kind=wait.kind, result=result)
+
+    @staticmethod
+    def _next_interval(wait, changed, now):
+        min_interval, max_interval = poll_intervals[wait.kind]
+        if changed:
+            wait.interval = min_interval
+        else:
+            wait.interval = min(max_interval, wait.interval * poll_backoff)
+        interval = wait.interval
+        if wait.eta is not None:
+            remaining = wait.eta - now
+            if remaining <= interval:
+                # 接近预计完成时间，按最短间隔轮询
+                interval = min_interval
+            else:
+                # 离预计完成时间还远，不必频繁查询
+                interval = max(interval, min(max_interval, remaining / 2))
+        return max(min_interval, interval * (1 + random.uniform(-poll_jitter, poll_jitter)))
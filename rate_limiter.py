@@ -0,0 +1,141 @@
+import json
+import time
+import logging
+import threading
+import urllib.parse
+import metrics
+from config import rate_limits, rate_limit_file, rate_limit_backoff
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只在进程内限流
+    fcntl = None
+
+# 通义接口限流：每个接口（按 URL 路径区分）一个令牌桶，速率和突发数见 config.rate_limits；
+# 桶的状态保存在 rate_limit_file 中并用文件锁保护，同时运行的多个脚本共享同一份额度；
+# 收到限流响应后该接口暂停 rate_limit_backoff 秒（连续限流时翻倍），之后恢复
+
+# 响应内容中出现这些关键字时视为被限流
+THROTTLE_KEYWORDS = ('频繁', '限流', 'too many', 'rate limit', 'throttl')
+
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def endpoint(url):
+    return urllib.parse.urlsplit(url).path
+
+
+def _budget(key):
+    return rate_limits.get(key, rate_limits['default'])
+
+
+class _SharedState:
+    """加锁读写 rate_limit_file，with 块内独占（进程内由 _lock、进程间由 flock 保证）"""
+
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.file = open(rate_limit_file, 'a+', encoding='utf-8')
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            self.file.seek(0)
+            try:
+                self.state = json.loads(self.file.read() or '{}')
+            except json.JSONDecodeError:
+                self.state = {}
+        except BaseException:
+            _lock.release()
+            raise
+        return self.state
+
+    def __exit__(self, *exc):
+        try:
+            self.file.seek(0)
+            self.file.truncate()
+            json.dump(self.state, self.file)
+            self.file.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            _lock.release()
+
+
+def _record_wait(key, seconds):
+    with _stats_lock:
+        key_stats = _stats.setdefault(key, {"requests": 0, "waited": 0.0, "throttled": 0})
+        key_stats["requests"] += 1
+        key_stats["waited"] += seconds
+
+
+def acquire(url):
+    """取得一个令牌后返回，额度不足或处于退避期时等待，返回等待的秒数"""
+    key = endpoint(url)
+    rate, burst = _budget(key)
+    waited = 0.0
+    while True:
+        with _SharedState() as state:
+            now = time.time()
+            bucket = state.setdefault(key, {"tokens": burst, "updated": now, "blocked_until": 0, "strikes": 0})
+            bucket["tokens"] = min(burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+            bucket["updated"] = now
+            if now >= bucket["blocked_until"] and bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                _record_wait(key, waited)
+                if waited:
+                    metrics.RATE_LIMIT_WAIT.inc(waited, endpoint=key)
+                return waited
+            delay = max(bucket["blocked_until"] - now, (1 - bucket["tokens"]) / rate)
+        time.sleep(delay)
+        waited += delay
+
+
+def is_throttled(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code != 200 or len(response.content) > 4096:
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or data.get('success', True) and not data.get('errorCode'):
+        return False
+    message = f"{data.get('errorCode', '')} {data.get('errorMsg', '')} {data.get('message', '')}".lower()
+    return any(keyword in message for keyword in THROTTLE_KEYWORDS)
+
+
+def report(url, response):
+    """根据响应调整：被限流时暂停该接口并清空令牌，正常响应时清除连续限流计数"""
+    key = endpoint(url)
+    throttled = is_throttled(response)
+    with _SharedState() as state:
+        bucket = state.get(key)
+        if bucket is None:
+            return
+        if not throttled:
+            bucket["strikes"] = 0
+            return
+        bucket["strikes"] += 1
+        backoff = min(rate_limit_backoff[1], rate_limit_backoff[0] * 2 ** (bucket["strikes"] - 1))
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            backoff = max(backoff, int(retry_after))
+        bucket["blocked_until"] = time.time() + backoff
+        bucket["tokens"] = 0
+    with _stats_lock:
+        _stats.setdefault(key, {"requests": 0, "waited": 0.0, "throttled": 0})["throttled"] += 1
+    logging.warning(f"接口 {key} 被限流，暂停 {backoff}s")
+
+
+def get_stats():
+    """返回 {接口: {"requests": n, "waited": 秒, "throttled": n}}"""
+    with _stats_lock:
+        return {key: dict(s) for key, s in _stats.items()}
+
+
+def log_stats():
+    for key, s in get_stats().items():
+        logging.info(f"限流统计 {key}: 请求 {s['requests']} 次，共等待 {s['waited']:.1f}s，被限流 {s['throttled']} 次")
@@ -0,0 +1,195 @@
+import os
+import re
+import sys
+import time
+import logging
+import sqlite3
+from config import search_db, result_dir, log_level, log_format, log_datefmt
+
+# 导出结果的全文索引（SQLite FTS5，trigram 分词，中文无需额外分词）：
+# 每条 srt 字幕、每段 md 文本和 record_info.txt 中的标题、关键字、摘要各为一条索引，
+# 按 (路径, 大小, mtime) 判断文件是否变化，重建时只重新索引新增或变化的文件
+# 用法: python search_index.py build [--full]   或   python search_index.py query 关键词 [数量]
+
+RECORD_INFO_FILE = 'record_info.txt'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    entries INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT,
+    title TEXT,
+    start_ms INTEGER,
+    end_ms INTEGER,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5 (
+    title, text, content='entries', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+END;
+"""
+
+SRT_TIME = re.compile(r'(\d{2}):(\d{2}):(\d{2})[,.](\d{3})')
+
+# trigram 分词至少需要 3 个字符，更短的关键词退回 LIKE 扫描
+MIN_MATCH_LENGTH = 3
+
+
+def connect():
+    conn = sqlite3.connect(search_db, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def srt_time_ms(groups):
+    hours, minutes, seconds, ms = (int(x) for x in groups)
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + ms
+
+
+def format_ms(ms):
+    if ms is None:
+        return ""
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def parse_srt(path):
+    """返回 [(开始毫秒, 结束毫秒, 文本), ...]"""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        blocks = re.split(r'\r?\n\s*\r?\n', f.read().strip())
+    cues = []
+    for block in blocks:
+        lines = block.splitlines()
+        for i, line in enumerate(lines):
+            if '-->' in line:
+                times = SRT_TIME.findall(line)
+                if len(times) == 2:
+                    start, end = (srt_time_ms(t) for t in times)
+                    text = ' '.join(lines[i + 1:]).strip()
+                    if text:
+                        cues.append((start, end, text))
+                break
+    return cues
+
+
+def parse_md(path):
+    """按空行分段，返回 [(None, None, 文本), ...]"""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        paragraphs = re.split(r'\n\s*\n', f.read())
+    return [(None, None, paragraph.strip()) for paragraph in paragraphs if paragraph.strip()]
+
+
+def parse_record_info(path):
+    """record_info.txt 每行一条：标题、关键字、摘要合为一条索引"""
+    entries = []
+    with open(path, 'r', encoding='utf8') as f:
+        for line in f:
+            if line.startswith('#') or '\t' not in line:
+                continue
+            parts = line.rstrip('\n').split('\t')
+            entries.append((parts[1], None, None, ' '.join(parts[1:])))
+    return entries
+
+
+def list_sources(root=result_dir):
+    """返回 {路径: 标题}；原文 md 与 srt 内容相同，有 srt 时只索引 srt（带时间戳）"""
+    sources = {}
+    if os.path.exists(RECORD_INFO_FILE):
+        sources[os.path.abspath(RECORD_INFO_FILE)] = None
+    for dirpath, _, filenames in os.walk(root):
+        title = os.path.basename(dirpath)
+        for filename in filenames:
+            if filename.endswith('.md') and filename[:-3] + '.srt' in filenames:
+                continue
+            if filename.endswith(('.srt', '.md')):
+                sources[os.path.abspath(os.path.join(dirpath, filename))] = title
+    return sources
+
+
+def build(root=result_dir, full=False):
+    """增量更新索引，返回 (重新索引的文件数, 删除的文件数, 跳过的文件数)"""
+    start_time = time.monotonic()
+    conn = connect()
+    sources = list_sources(root)
+    indexed = {row['path']: (row['size'], row['mtime_ns']) for row in conn.execute("SELECT * FROM files")}
+
+    changed = []
+    for path in sources:
+        stat = os.stat(path)
+        if full or indexed.get(path) != (stat.st_size, stat.st_mtime_ns):
+            changed.append((path, stat))
+    removed = [path for path in indexed if path not in sources]
+
+    entry_count = 0
+    conn.execute("BEGIN")
+    for path in removed:
+        conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+        conn.execute("DELETE FROM files WHERE path = ?", (path,))
+    for path, stat in changed:
+        title = sources[path]
+        if title is None:
+            rows = parse_record_info(path)
+        else:
+            rows = [(title, start, end, text) for start, end, text in (parse_srt(path) if path.endswith('.srt') else parse_md(path))]
+        conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+        conn.executemany("INSERT INTO entries (path, title, start_ms, end_ms, text) VALUES (?, ?, ?, ?, ?)",
+                         [(path, *row) for row in rows])
+        conn.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, entries) VALUES (?, ?, ?, ?)",
+                     (path, stat.st_size, stat.st_mtime_ns, len(rows)))
+        entry_count += len(rows)
+    conn.execute("COMMIT")
+    if changed or removed:
+        conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('optimize')")
+    conn.close()
+
+    skipped = len(sources) - len(changed)
+    logging.info(f"索引更新完成: 重新索引 {len(changed)} 个文件（{entry_count} 条），删除 {len(removed)} 个，"
+                 f"跳过未变化的 {skipped} 个，用时 {time.monotonic() - start_time:.2f}s")
+    return len(changed), len(removed), skipped
+
+
+def search(keyword, limit=20):
+    """返回 [{'title', 'start', 'end', 'path', 'snippet'}, ...]，字幕按相关度排序"""
+    conn = connect()
+    if len(keyword) >= MIN_MATCH_LENGTH:
+        # 关键词整体作为短语匹配
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        rows = conn.execute(
+            "SELECT e.title, e.start_ms, e.end_ms, e.path, snippet(entries_fts, 1, '[', ']', '…', 20) AS snippet "
+            "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid WHERE entries_fts MATCH ? "
+            "ORDER BY rank LIMIT ?", (phrase, limit)).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT title, start_ms, end_ms, path, substr(text, 1, 80) AS snippet FROM entries "
+            "WHERE text LIKE ? OR title LIKE ? LIMIT ?", (f'%{keyword}%', f'%{keyword}%', limit)).fetchall()
+    conn.close()
+    return [{'title': row['title'], 'start': format_ms(row['start_ms']), 'end': format_ms(row['end_ms']),
+             'path': row['path'], 'snippet': row['snippet']} for row in rows]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
+    args = sys.argv[1:]
+    if args and args[0] == 'build':
+        build(full='--full' in args)
+    elif len(args) >= 2 and args[0] == 'query':
+        start = time.perf_counter()
+        results = search(args[1], int(args[2]) if len(args) > 2 else 20)
+        for result in results:
+            print(f"{result['title']}\t{result['start']}\t{result['snippet']}")
+        print(f"共 {len(results)} 条，用时 {(time.perf_counter() - start) * 1000:.1f}ms")
+    else:
+        print("用法: python search_index.py build [--full] | python search_index.py query 关键词 [数量]")
@@ -0,0 +1,200 @@
+import os
+import re
+import sys
+import shutil
+import logging
+import subprocess
+import job_store
+from acquire import probe_duration
+from config import episodes_dir, history_dir, result_dir, segment_seconds, segment_at_silence, silence_noise_db, \
+    silence_min_seconds, silence_search_seconds, log_level, log_format, log_datefmt
+
+# 长音频分段：超过 max_duration 的音频按 segment_seconds 无损切分（可选在静音处切分），各段同时发布到 podcast 并行转写，
+# 全部导出后把各段的 srt / md 按时间偏移合并为一份，字幕序号重新编号
+# 用法: python segment.py split 音频文件   或   python segment.py merge 原始标题
+
+SRT_TIME = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3})')
+# md 原文中发言人行的时间戳，如 "发言人1 01:02:03" 或 "发言人1 02:03"
+# 整行只有发言人和时间戳时才修正，正文中的 "12:30"、比分等不会被改动
+MD_SPEAKER_TIME = re.compile(r'^(\s*\S+\s+)(?:(\d{1,2}):)?(\d{2}):(\d{2})(\s*)$')
+
+
+def detect_silences(path):
+    """返回静音区间中点列表（秒）"""
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-nostats', '-i', path, '-af',
+                             f'silencedetect=noise={silence_noise_db}dB:d={silence_min_seconds}', '-f', 'null', '-'],
+                            capture_output=True, text=True)
+    starts = [float(x) for x in re.findall(r'silence_start: ([\d.]+)', result.stderr)]
+    ends = [float(x) for x in re.findall(r'silence_end: ([\d.]+)', result.stderr)]
+    return [(start + end) / 2 for start, end in zip(starts, ends)]
+
+
+def cut_points(duration, silences=None):
+    """每隔 segment_seconds 切一刀；有静音数据时取该位置之前 silence_search_seconds 内最近的静音"""
+    points = []
+    target = segment_seconds
+    while target < duration:
+        point = target
+        if silences:
+            candidates = [s for s in silences if target - silence_search_seconds <= s <= target and s > (points[-1] if points else 0)]
+            if candidates:
+                point = candidates[-1]
+        points.append(point)
+        target = point + segment_seconds
+    return points
+
+
+def split_audio(path, at_silence=segment_at_silence):
+    """把音频无损切分为多段放入 episodes_dir，原始文件移动到 history_dir，返回各段路径"""
+    duration = probe_duration(path)
+    filename = os.path.basename(path)
+    name, extension = os.path.splitext(filename)
+    points = cut_points(duration, detect_silences(path) if at_silence else None)
+    if not points:
+        return [path]
+
+    pattern = os.path.join(episodes_dir, f"{name}_p%d{extension}")
+    logging.info(f"[segment] {filename} 时长 {duration:.0f}s，切分为 {len(points) + 1} 段: {[round(p) for p in points]}")
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', path, '-map', '0:a', '-c', 'copy', '-f', 'segment',
+                    '-segment_times', ','.join(f"{p:.3f}" for p in points), '-segment_start_number', '1',
+                    '-reset_timestamps', '1', pattern], check=True)
+    part_paths = [pattern % i for i in range(1, len(points) + 2)]
+
+    # 无损切分只能在包边界切开，按实际时长累加得到每段的准确偏移
+    parts = []
+    offset = 0.0
+    for part_path in part_paths:
+        parts.append((os.path.splitext(os.path.basename(part_path))[0], offset))
+        offset += probe_duration(part_path)
+    job_store.add_segments(name, parts)
+    shutil.move(path, os.path.join(history_dir, filename))
+    return part_paths
+
+
+def format_srt_time(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def shift_srt_time(match, offset_ms):
+    hours, minutes, seconds, ms = (int(x) for x in match.groups())
+    return format_srt_time(((hours * 60 + minutes) * 60 + seconds) * 1000 + ms + offset_ms)
+
+
+def merge_srt(parts, output_path):
+    """parts 为 [(srt 路径, 偏移秒数), ...]"""
+    index = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for srt_path, offset in parts:
+            offset_ms = round(offset * 1000)
+            with open(srt_path, 'r', encoding='utf-8-sig') as f:
+                blocks = re.split(r'\r?\n\s*\r?\n', f.read().strip())
+            for block in blocks:
+                lines = block.splitlines()
+                # 去掉原序号，只保留时间行和字幕内容
+                if lines and lines[0].strip().isdigit():
+                    lines = lines[1:]
+                if not lines or '-->' not in lines[0]:
+                    continue
+                index += 1
+                lines[0] = SRT_TIME.sub(lambda m: shift_srt_time(m, offset_ms), lines[0])
+                out.write(f"{index}\n" + "\n".join(lines) + "\n\n")
+    return index
+
+
+def shift_md_time(match, offset):
+    speaker, hours, minutes, seconds, tail = match.groups()
+    total = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + round(offset)
+    hours, rest = divmod(total, 3600)
+    stamp = f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}" if hours or match.group(2) else f"{rest // 60:02d}:{rest % 60:02d}"
+    return speaker + stamp + tail
+
+
+def merge_md(parts, output_path, shift_time):
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for index, (md_path, offset) in enumerate(parts, 1):
+            with open(md_path, 'r', encoding='utf-8-sig') as f:
+                content = f.read()
+            if shift_time:
+                content = "\n".join(MD_SPEAKER_TIME.sub(lambda m: shift_md_time(m, offset), line)
+                                    for line in content.splitlines())
+            if len(parts) > 1:
+                out.write(("\n" if index > 1 else "") + f"## 第 {index} 段\n\n")
+            out.write(content.strip() + "\n")
+
+
+def merge_transcripts(source_title):
+    """
+    合并各段的导出结果到 result/<原始标题>/，返回合并的文件数；
+    只合并每一段都已导出的文件（两阶段导出时导读、脑图较晚才有），可重复执行，每次覆盖上次的结果
+    """
+    segments = job_store.get_segments(source_title)
+    target_dir = os.path.join(result_dir, source_title)
+    os.makedirs(target_dir, exist_ok=True)
+
+    # 按文件名（把段标题替换为原始标题）归组
+    groups = {}
+    for segment in segments:
+        part_dir = os.path.join(result_dir, segment['part_title'])
+        if not os.path.isdir(part_dir):
+            logging.warning(f"[segment] 未找到 {part_dir}，跳过")
+            continue
+        for file_name in sorted(os.listdir(part_dir)):
+            if file_name.endswith(('.part', '.part.meta', '.tmp')):
+                continue  # 下载中的临时文件
+            merged_name = file_name.replace(segment['part_title'], source_title, 1)
+            groups.setdefault(merged_name, []).append((os.path.join(part_dir, file_name), segment))
+
+    merged = 0
+    for merged_name, parts in groups.items():
+        if len(parts) < len(segments):
+            logging.info(f"[segment] {merged_name} 只有 {len(parts)} / {len(segments)} 段，暂不合并")
+            continue
+        merged += 1
+        output_path = os.path.join(target_dir, merged_name)
+        # 先写临时文件再替换，重复合并时不会留下写了一半的文件
+        tmp_path = output_path + '.tmp'
+        offsets = [(path, segment['offset_seconds']) for path, segment in parts]
+        if merged_name.endswith('.srt'):
+            count = merge_srt(offsets, tmp_path)
+            os.replace(tmp_path, output_path)
+            logging.info(f"[segment] 已合并 {merged_name}，共 {count} 条字幕")
+        elif merged_name.endswith('.md'):
+            # 只有原文带时间戳，导读、脑图直接按段拼接
+            merge_md(offsets, tmp_path, shift_time='原文' in merged_name)
+            os.replace(tmp_path, output_path)
+            logging.info(f"[segment] 已合并 {merged_name}")
+        else:
+            # 图片等无法合并的文件按段复制
+            name, extension = os.path.splitext(merged_name)
+            for path, segment in parts:
+                shutil.copyfile(path, os.path.join(target_dir, f"{name}_p{segment['part_index']}{extension}"))
+    return merged
+
+
+def merge_if_complete(part_title):
+    """part_title 是分段音频的一段且所有段的原文、字幕都已导出时合并，返回是否已合并"""
+    segment = job_store.get_segment(part_title)
+    if segment is None:
+        return False
+    segments = job_store.get_segments(segment['source_title'])
+    if len(segments) < segment['part_count'] or not all(
+            job_store.reached(job_store.get_record_by_title(s['part_title']), 'transcript_exported') for s in segments):
+        logging.info(f"[segment] {segment['source_title']} 尚有分段未导出，稍后合并")
+        return False
+    merge_transcripts(segment['source_title'])
+    logging.info(f"[segment] {segment['source_title']} 共 {len(segments)} 段，已合并到 {result_dir}{segment['source_title']}")
+    return True
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=log_level, format=log_format, datefmt=log_datefmt)
+    if len(sys.argv) == 3 and sys.argv[1] == 'split':
+        for part_path in split_audio(sys.argv[2]):
+            print(part_path)
+    elif len(sys.argv) == 3 and sys.argv[1] == 'merge':
+        merge_transcripts(sys.argv[2])
+    else:
+        print("用法: python segment.py split 音频文件 | python segment.py merge 原始标题")
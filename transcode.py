@@ -0,0 +1,199 @@
+import os
+import sys
+import fcntl
+import time
+import hashlib
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import job_store
+from config import episodes_dir, transcode_format, transcode_bitrate, transcode_cache_dir, transcode_cache_max_bytes, \
+    transcode_workers
+
+# 上传用的转码缓存：语音识别只需要低码率单声道音频，把 yt-dlp 下载的 webm/m4a/wav 转为 Opus 或 AAC 后再发布，
+# 通义拉取音频（queryNetSourceParse 等待的阶段）的数据量可减少一个数量级。
+# 转码结果按原文件内容的 sha256 缓存在 transcode_cache_dir，文件重命名、移动后仍可复用，
+# 缓存超过 transcode_cache_max_bytes 时按最近使用时间淘汰；同一文件同时只转码一次（进程内共用 Future，多个 gunicorn 进程之间用文件锁）
+# 用法: python transcode.py [文件 ...]（默认转码 episodes_dir 中的全部音频）  或   python transcode.py evict
+
+# 格式 -> (扩展名, MIME 类型, ffmpeg 参数)
+FORMATS = {
+    'opus': ('.opus', 'audio/ogg', ['-c:a', 'libopus', '-application', 'voip', '-f', 'ogg']),
+    'aac': ('.aac', 'audio/aac', ['-c:a', 'aac', '-f', 'adts']),
+}
+
+_pending = {}  # 原文件路径 -> 后台转码的 Future
+_failed = set()  # 转码失败的 (路径, mtime)，文件未变化时不再重试
+_lock = threading.Lock()
+_executor = None
+
+
+def file_hash(path):
+    """文件内容的 sha256，按 (文件名, 大小, mtime) 缓存在状态库中"""
+    stat = os.stat(path)
+    file_name = os.path.basename(path)
+    digest = job_store.get_hash(file_name, stat.st_size, stat.st_mtime_ns)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        job_store.set_hash(file_name, stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def cache_path(digest):
+    return os.path.join(transcode_cache_dir, f"{digest[:32]}-{transcode_bitrate}{FORMATS[transcode_format][0]}")
+
+
+def mime_type():
+    return FORMATS[transcode_format][1]
+
+
+def derived_name(filename):
+    """转码后发布的文件名：原文件名换成转码格式的扩展名"""
+    return os.path.splitext(filename)[0] + FORMATS[transcode_format][0]
+
+
+def cache_version():
+    """缓存目录的 mtime，有文件写入或淘汰时变化，podcast_server 据此刷新 feed 缓存"""
+    try:
+        return os.stat(transcode_cache_dir).st_mtime_ns
+    except OSError:
+        return None
+
+
+def lookup(path):
+    """已转码时返回缓存文件路径，否则返回 None（只查询状态库，不读取原文件）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    digest = job_store.get_hash(os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+    if digest is None:
+        return None
+    derived = cache_path(digest)
+    return derived if os.path.exists(derived) else None
+
+
+def touch(derived):
+    """记录最近使用时间，供淘汰时参考"""
+    try:
+        os.utime(derived)
+    except OSError:
+        pass
+
+
+def ffmpeg_command(path, output):
+    return ['ffmpeg', '-v', 'error', '-nostdin', '-y', '-i', path, '-vn', '-ac', '1', '-ar', '16000',
+            '-b:a', transcode_bitrate] + FORMATS[transcode_format][2] + [output]
+
+
+def transcode(path):
+    """转码（已有缓存时直接返回），返回缓存文件路径"""
+    derived = cache_path(file_hash(path))
+    if os.path.exists(derived):
+        touch(derived)
+        return derived
+    os.makedirs(transcode_cache_dir, exist_ok=True)
+    with open(derived + '.lock', 'a') as lock:
+        # 其他进程正在转码同一文件时等待其完成，直接使用其结果
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(derived):
+            touch(derived)
+            return derived
+        tmp_path = f"{derived}.{os.getpid()}.{threading.get_ident()}.tmp"
+        start = time.monotonic()
+        try:
+            result = subprocess.run(ffmpeg_command(path, tmp_path), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg 转码出错 {os.path.basename(path)}: {result.stderr.strip()}")
+            os.replace(tmp_path, derived)
+            os.remove(derived + '.lock')
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    logging.info(f"[transcode] {os.path.basename(path)} {os.path.getsize(path) / 1024 ** 2:.1f}MB -> "
+                 f"{os.path.getsize(derived) / 1024 ** 2:.1f}MB，用时 {time.monotonic() - start:.1f}s")
+    evict()
+    return derived
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _run(path):
+    try:
+        return transcode(path)
+    except Exception as e:
+        logging.error(f"[transcode] {e}")
+        with _lock:
+            _failed.add((path, _mtime(path)))
+        return None
+    finally:
+        with _lock:
+            _pending.pop(path, None)
+
+
+def submit(path):
+    """
+    提交后台转码（同一文件同时只转码一次），返回 Future，结果为缓存文件路径，失败时为 None；
+    此前转码失败且文件未变化时返回 None
+    """
+    global _executor
+    with _lock:
+        if (path, _mtime(path)) in _failed:
+            return None
+        future = _pending.get(path)
+        if future is None:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, transcode_workers), thread_name_prefix="transcode")
+            future = _executor.submit(_run, path)
+            _pending[path] = future
+        return future
+
+
+def prepare(paths):
+    """上传前转码一批文件并等待完成，返回 {path: 缓存文件路径 | None}"""
+    futures = {path: submit(path) for path in paths}
+    return {path: future.result() if future else None for path, future in futures.items()}
+
+
+def evict(max_bytes=transcode_cache_max_bytes):
+    """缓存超过上限时按最近使用时间删除最旧的文件，返回删除的文件数"""
+    if not os.path.exists(transcode_cache_dir):
+        return 0
+    with os.scandir(transcode_cache_dir) as entries:
+        files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries
+                        if entry.is_file() and not entry.name.endswith(('.tmp', '.lock'))))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logging.info(f"[transcode] 缓存超过上限，删除 {removed} 个文件，剩余 {total / 1024 ** 3:.2f}GB")
+    return removed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ['evict']:
+        evict()
+    else:
+        from acquire import list_audio
+        targets = sys.argv[1:] or list_audio(episodes_dir)
+        results = prepare(targets)
+        print(f"转码完成 {sum(1 for r in results.values() if r)} / {len(results)}")
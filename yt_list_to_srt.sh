@@ -106,42 +106,60 @@ echo "检测时长处理完成"
 
 sleep 2
 
-echo "准备启动 podcast_server"
+# podcast_server 由同时运行的多个上传共用（每次上传发布自己的批次），
+# 已在运行时直接使用；只结束本次启动的进程，且仍有其他批次在发布时保持运行
+SERVER_PID=""
 
-python3 podcast_server.py > podcast_server.log 2>&1 &
+stop_podcast_server() {
 
-if [ $? -ne 0 ]; then
+  if [ -n "$SERVER_PID" ] && [ -z "$(python3 batches.py list)" ]; then
+    echo "结束 podcast_server"
+    kill "$SERVER_PID"
+  elif [ -n "$SERVER_PID" ]; then
+    echo "仍有其他批次在发布，podcast_server 保持运行"
+  fi
 
-  echo "启动 podcast_server 出错"
-  exit 1
+}
 
-fi
+if python3 -c "import socket, config; socket.create_connection(('127.0.0.1', config.port), timeout=1)" 2>/dev/null; then
 
-sleep 2
+  echo "podcast_server 已在运行"
+
+else
+
+  echo "准备启动 podcast_server"
+  python3 podcast_server.py > podcast_server.log 2>&1 &
+  SERVER_PID=$!
+
+  sleep 2
+
+  if ! kill -0 "$SERVER_PID" 2>/dev/null; then
+
+    echo "启动 podcast_server 出错"
+    exit 1
+
+  fi
+
+  echo "podcast_server 启动完成"
+
+fi
 
-echo "podcast_server 启动完成"
 echo "准备上传至通义"
 
+# 上传完成后 podcast_upload.py 只把本批次的音频移动到 history/，其他批次的文件不受影响
 python3 podcast_upload.py
 
 if [ $? -ne 0 ]; then
 
   echo "上传至通义出错"
-  echo "结束 podcast_server"
-  pkill -f "python3 podcast_server.py"
+  stop_podcast_server
   exit 1
 
 fi
 
 sleep 2
 
-echo "结束 podcast_server"
-pkill -f "python3 podcast_server.py"
-
-sleep 2
-
-echo "移动 $(ls audio) 到 $HISTORY_DIR/"
-mv audio/* $HISTORY_DIR/
+stop_podcast_server
 
 echo "准备导出"
 